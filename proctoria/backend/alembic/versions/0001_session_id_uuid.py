@@ -0,0 +1,31 @@
+"""Store proctoring_sessions.session_id as a native UUID
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-14
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def _column_type(table: str, column: str) -> str:
+    """Current type of a column as PostgreSQL names it (databases built by create_all are already migrated)."""
+    return op.get_bind().execute(
+        sa.text(
+            "SELECT data_type FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = :table AND column_name = :column"
+        ),
+        {"table": table, "column": column},
+    ).scalar()
+
+def upgrade():
+    # Session IDs were always str(uuid4()), so every existing value casts; the unique index is rebuilt by the ALTER
+    if _column_type("proctoring_sessions", "session_id") != "uuid":
+        op.execute("ALTER TABLE proctoring_sessions ALTER COLUMN session_id TYPE uuid USING session_id::uuid")
+
+def downgrade():
+    op.execute("ALTER TABLE proctoring_sessions ALTER COLUMN session_id TYPE varchar(255) USING session_id::text")
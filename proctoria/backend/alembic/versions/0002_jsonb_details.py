@@ -0,0 +1,37 @@
+"""Store violation details and analytics values as JSONB
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-14
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+def _column_type(table: str, column: str) -> str:
+    """Current type of a column as PostgreSQL names it (databases built by create_all are already migrated)."""
+    return op.get_bind().execute(
+        sa.text(
+            "SELECT data_type FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = :table AND column_name = :column"
+        ),
+        {"table": table, "column": column},
+    ).scalar()
+
+def upgrade():
+    # The text columns held free-form strings rather than JSON documents, so each value becomes a JSON string
+    # (to_jsonb) instead of being parsed (::jsonb, which would reject them)
+    if _column_type("violations", "details") != "jsonb":
+        op.execute("ALTER TABLE violations ALTER COLUMN details TYPE jsonb USING to_jsonb(details)")
+    if _column_type("analytics", "metric_value") != "jsonb":
+        op.execute("ALTER TABLE analytics ALTER COLUMN metric_value TYPE jsonb USING to_jsonb(metric_value)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_analytics_metric_value ON analytics USING gin (metric_value)")
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_analytics_metric_value")
+    op.execute("ALTER TABLE analytics ALTER COLUMN metric_value TYPE text USING metric_value #>> '{}'")
+    op.execute("ALTER TABLE violations ALTER COLUMN details TYPE text USING details #>> '{}'")
@@ -0,0 +1,34 @@
+"""Add violations.type_id and backfill it from violations.type
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-14
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from models.models import VIOLATION_TYPE_IDS
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.execute("ALTER TABLE violations ADD COLUMN IF NOT EXISTS type_id smallint")
+
+    # Same mapping as models.violation_type_id: ids from the append-only registry, 0 for unknown types
+    type_ids = sa.case(
+        {violation_type: type_id for violation_type, type_id in VIOLATION_TYPE_IDS.items()},
+        value=sa.column("type"),
+        else_=0,
+    )
+    violations = sa.table("violations", sa.column("type"), sa.column("type_id"))
+    op.execute(violations.update().where(violations.c.type_id.is_(None)).values(type_id=type_ids))
+
+    op.execute("ALTER TABLE violations ALTER COLUMN type_id SET NOT NULL")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_violations_type_id ON violations (type_id)")
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_violations_type_id")
+    op.execute("ALTER TABLE violations DROP COLUMN IF EXISTS type_id")
@@ -0,0 +1,10 @@
+import redis.asyncio as redis
+from config import settings
+
+# Shared Redis connection pool; connections are opened lazily
+redis_pool = redis.ConnectionPool.from_url(
+    settings.redis_url,
+    max_connections=settings.redis_max_connections,
+    decode_responses=True
+)
+redis_client = redis.Redis(connection_pool=redis_pool)
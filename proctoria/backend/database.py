@@ -1,21 +1,34 @@
-from sqlalchemy import create_engine, MetaData
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import DeclarativeBase
 from config import settings
+import orjson
 
-# Create engine
-engine = create_engine(settings.database_url)
+def _async_database_url(url: str) -> str:
+    """Use the asyncpg driver for plain postgresql:// URLs."""
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    return url
 
-# Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Create engine (JSONB columns are encoded and decoded with orjson; pooled connections are
+# checked before use so ones dropped by the server or a proxy are replaced instead of failing a write)
+engine = create_async_engine(
+    _async_database_url(settings.database_url),
+    pool_size=settings.database_pool_size,
+    max_overflow=settings.database_max_overflow,
+    pool_pre_ping=True,
+    pool_recycle=settings.database_pool_recycle,
+    json_serializer=lambda value: orjson.dumps(value).decode(),
+    json_deserializer=orjson.loads
+)
+
+# Create session factory (objects stay usable after commit, which would otherwise need a lazy reload)
+SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
 
 # Create base class for models
-Base = declarative_base()
+class Base(DeclarativeBase):
+    pass
 
 # Dependency to get DB session
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
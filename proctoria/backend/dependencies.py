@@ -0,0 +1,49 @@
+from fastapi import Path, Query
+from typing import Annotated
+
+from config import settings
+from schemas.schemas import SESSION_ID_PATTERN, normalize_session_id
+from cache import redis_client
+from services.lazy import Lazy
+from services.behavior_analyzer import BehaviorAnalyzer
+from services.session_manager import SessionManager
+from services.violation_processor import ViolationProcessor
+from services.risk_calculator import RiskCalculator
+from services.websocket_manager import WebSocketManager
+from services.frame_batcher import FrameBatcher
+from services.status_cache import SessionStatusCache
+from services.violation_buffer import ViolationWriteBuffer
+from services.upload_buffers import UploadBufferPool
+
+# Shared service instances used by the app and its routers (the ML service loads its models on first use;
+# await ml_service.get() to reach it)
+ml_service = Lazy("services.ml_service", "MLService")
+behavior_analyzer = BehaviorAnalyzer()
+session_manager = SessionManager()
+violation_processor = ViolationProcessor()
+status_cache = SessionStatusCache(
+    redis_client,
+    session_manager,
+    risk_ttl=settings.session_risk_cache_ttl,
+    state_ttl=settings.session_state_cache_ttl
+)
+risk_calculator = RiskCalculator(status_cache=status_cache)
+websocket_manager = WebSocketManager(redis_client)
+frame_batcher = FrameBatcher(
+    ml_service,
+    max_batch_size=settings.frame_batch_max_size,
+    max_wait_ms=settings.frame_batch_max_wait_ms
+)
+violation_buffer = ViolationWriteBuffer(
+    violation_processor,
+    status_cache,
+    risk_calculator,
+    flush_interval_ms=settings.violation_flush_interval_ms,
+    max_pending=settings.violation_flush_max_pending,
+    max_attempts=settings.violation_flush_max_attempts
+)
+upload_buffers = UploadBufferPool(settings.max_file_size, max_pooled_bytes=settings.upload_buffer_pool_bytes)
+
+# Session ID parameter types for the routers
+SessionIdPath = Annotated[str, Path(pattern=SESSION_ID_PATTERN), normalize_session_id]
+SessionIdQuery = Annotated[str, Query(pattern=SESSION_ID_PATTERN), normalize_session_id]
@@ -0,0 +1,30 @@
+import re
+from typing import Sequence
+
+from fastapi.middleware.cors import CORSMiddleware
+
+class OriginSetCORSMiddleware(CORSMiddleware):
+    """CORS middleware that matches origins against a frozenset and one precompiled wildcard pattern.
+
+    Entries in allow_origins containing "*" (other than a lone "*") are treated as wildcards,
+    e.g. "https://*.example.com".
+    """
+
+    def __init__(self, app, allow_origins: Sequence[str] = (), **kwargs):
+        super().__init__(app, allow_origins=allow_origins, **kwargs)
+        exact = [origin for origin in allow_origins if "*" not in origin]
+        wildcards = [origin for origin in allow_origins if "*" in origin and origin != "*"]
+
+        self.allow_origins = frozenset(exact)
+        self.allow_origin_wildcards = re.compile(
+            "|".join(re.escape(origin).replace(r"\*", "[^/]*") for origin in wildcards)
+        ) if wildcards else None
+
+    def is_allowed_origin(self, origin: str) -> bool:
+        if self.allow_all_origins or origin in self.allow_origins:
+            return True
+
+        if self.allow_origin_regex is not None and self.allow_origin_regex.fullmatch(origin):
+            return True
+
+        return self.allow_origin_wildcards is not None and self.allow_origin_wildcards.fullmatch(origin) is not None
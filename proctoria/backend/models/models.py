@@ -1,78 +1,130 @@
-from sqlalchemy import Column, Integer, String, Text, Float, Boolean, DateTime, ForeignKey
-from sqlalchemy.orm import relationship
+from datetime import datetime
+from typing import Any, List, Optional
+from sqlalchemy import Integer, SmallInteger, String, Text, Float, Boolean, DateTime, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.sql import func
 from database import Base
 
+# Known violation types, stored as violations.type_id; append new types, never reorder (0 = other)
+VIOLATION_TYPES = (
+    "face_not_detected",
+    "multiple_faces",
+    "identity_mismatch",
+    "cell_phone_detected",
+    "book_detected",
+    "laptop_detected",
+    "tablet_detected",
+    "person_detected",
+    "poor_posture",
+    "gaze_deviation",
+    "tab_switch",
+    "copy_paste",
+    "developer_tools",
+    "multiple_speakers",
+    "suspicious_audio",
+)
+VIOLATION_TYPE_IDS = {violation_type: type_id for type_id, violation_type in enumerate(VIOLATION_TYPES, start=1)}
+
+def violation_type_id(violation_type: str) -> int:
+    """Map a violation type to its stored id."""
+    return VIOLATION_TYPE_IDS.get(violation_type, 0)
+
+def _default_type_id(context) -> int:
+    return violation_type_id(context.get_current_parameters()["type"])
+
 class ProctoringSession(Base):
     __tablename__ = "proctoring_sessions"
-    
-    id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(String(255), unique=True, index=True, nullable=False)
-    user_id = Column(Integer, nullable=False)
-    quiz_id = Column(Integer, nullable=False)
-    attempt_id = Column(Integer, nullable=False)
-    status = Column(String(20), default="active")
-    risk_score = Column(Float, default=0.0)
-    violation_count = Column(Integer, default=0)
-    timestarted = Column(DateTime(timezone=True), server_default=func.now())
-    timeended = Column(DateTime(timezone=True), nullable=True)
-    timecreated = Column(DateTime(timezone=True), server_default=func.now())
-    timemodified = Column(DateTime(timezone=True), onupdate=func.now())
-    
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    session_id: Mapped[str] = mapped_column(UUID(as_uuid=False), unique=True, index=True)  # native 16-byte UUID, exposed as a string
+    user_id: Mapped[int] = mapped_column(Integer)
+    quiz_id: Mapped[int] = mapped_column(Integer)
+    attempt_id: Mapped[int] = mapped_column(Integer)
+    status: Mapped[Optional[str]] = mapped_column(String(16), default="active")
+    risk_score: Mapped[Optional[float]] = mapped_column(Float, default=0.0)
+    violation_count: Mapped[Optional[int]] = mapped_column(Integer, default=0)
+    timestarted: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    timeended: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    timecreated: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    timemodified: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), onupdate=func.now())
+
     # Relationships
-    violations = relationship("Violation", back_populates="session")
-    analytics = relationship("Analytics", back_populates="session")
+    violations: Mapped[List["Violation"]] = relationship(back_populates="session")
+    violation_summary: Mapped[List["ViolationSummary"]] = relationship(back_populates="session")
+    analytics: Mapped[List["Analytics"]] = relationship(back_populates="session")
 
 class Violation(Base):
     __tablename__ = "violations"
-    
-    id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(Integer, ForeignKey("proctoring_sessions.id"), nullable=False)
-    type = Column(String(50), nullable=False)
-    confidence = Column(Float, nullable=False)
-    details = Column(Text, nullable=True)
-    screenshot_url = Column(String(255), nullable=True)
-    resolved = Column(Boolean, default=False)
-    timecreated = Column(DateTime(timezone=True), server_default=func.now())
-    
+    __table_args__ = (
+        Index("ix_violations_session_time", "session_id", "timecreated"),
+        Index("ix_violations_session_resolved", "session_id", "resolved"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    session_id: Mapped[int] = mapped_column(ForeignKey("proctoring_sessions.id"))
+    type: Mapped[str] = mapped_column(String(50))
+    type_id: Mapped[int] = mapped_column(SmallInteger, default=_default_type_id, index=True)
+    confidence: Mapped[float] = mapped_column(Float)
+    details: Mapped[Any] = mapped_column(JSONB, nullable=True)
+    screenshot_url: Mapped[Optional[str]] = mapped_column(String(255))
+    resolved: Mapped[Optional[bool]] = mapped_column(Boolean, default=False)
+    timecreated: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
     # Relationships
-    session = relationship("ProctoringSession", back_populates="violations")
+    session: Mapped["ProctoringSession"] = relationship(back_populates="violations")
+
+class ViolationSummary(Base):
+    """Per-session violation counts by type, kept up to date as violations are stored and resolved."""
+    __tablename__ = "session_violation_summary"
+
+    session_id: Mapped[int] = mapped_column(ForeignKey("proctoring_sessions.id"), primary_key=True)
+    type: Mapped[str] = mapped_column(String(50), primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, default=0)
+    resolved_count: Mapped[int] = mapped_column(Integer, default=0)
+
+    # Relationships
+    session: Mapped["ProctoringSession"] = relationship(back_populates="violation_summary")
 
 class Analytics(Base):
     __tablename__ = "analytics"
-    
-    id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(Integer, ForeignKey("proctoring_sessions.id"), nullable=False)
-    question_id = Column(Integer, nullable=True)
-    metric_type = Column(String(50), nullable=False)
-    metric_value = Column(Text, nullable=False)
-    timecreated = Column(DateTime(timezone=True), server_default=func.now())
-    
+    __table_args__ = (
+        Index("ix_analytics_session_metric_time", "session_id", "metric_type", "timecreated"),
+        Index("ix_analytics_metric_value", "metric_value", postgresql_using="gin"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    session_id: Mapped[int] = mapped_column(ForeignKey("proctoring_sessions.id"))
+    question_id: Mapped[Optional[int]] = mapped_column(Integer)
+    metric_type: Mapped[str] = mapped_column(String(50))
+    metric_value: Mapped[Any] = mapped_column(JSONB, nullable=False)
+    timecreated: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
     # Relationships
-    session = relationship("ProctoringSession", back_populates="analytics")
+    session: Mapped["ProctoringSession"] = relationship(back_populates="analytics")
 
 class IdentityBaseline(Base):
     __tablename__ = "identity_baselines"
-    
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, unique=True, nullable=False)
-    face_encoding = Column(Text, nullable=True)
-    voice_print = Column(Text, nullable=True)
-    baseline_image_url = Column(String(255), nullable=True)
-    verification_status = Column(String(20), default="pending")
-    timecreated = Column(DateTime(timezone=True), server_default=func.now())
-    timemodified = Column(DateTime(timezone=True), onupdate=func.now())
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    user_id: Mapped[int] = mapped_column(Integer, unique=True)
+    face_encoding: Mapped[Optional[str]] = mapped_column(Text)
+    voice_print: Mapped[Optional[str]] = mapped_column(Text)
+    baseline_image_url: Mapped[Optional[str]] = mapped_column(String(255))
+    verification_status: Mapped[Optional[str]] = mapped_column(String(16), default="pending")
+    timecreated: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    timemodified: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), onupdate=func.now())
 
 class PlagiarismReport(Base):
     __tablename__ = "plagiarism_reports"
-    
-    id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(Integer, ForeignKey("proctoring_sessions.id"), nullable=False)
-    question_id = Column(Integer, nullable=False)
-    submission_hash = Column(String(64), nullable=False)
-    similarity_score = Column(Float, nullable=False)
-    matches_found = Column(Integer, default=0)
-    report_url = Column(String(255), nullable=True)
-    status = Column(String(20), default="pending")
-    timecreated = Column(DateTime(timezone=True), server_default=func.now())
-    timeprocessed = Column(DateTime(timezone=True), nullable=True)
\ No newline at end of file
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    session_id: Mapped[int] = mapped_column(ForeignKey("proctoring_sessions.id"))
+    question_id: Mapped[int] = mapped_column(Integer)
+    submission_hash: Mapped[str] = mapped_column(String(64))
+    similarity_score: Mapped[float] = mapped_column(Float)
+    matches_found: Mapped[Optional[int]] = mapped_column(Integer, default=0)
+    report_url: Mapped[Optional[str]] = mapped_column(String(255))
+    status: Mapped[Optional[str]] = mapped_column(String(16), default="pending")
+    timecreated: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    timeprocessed: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
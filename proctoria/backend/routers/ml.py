@@ -0,0 +1,175 @@
+from fastapi import APIRouter, HTTPException, Depends, File, UploadFile
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, List, Optional
+import logging
+
+from database import get_db
+from schemas import schemas
+from dependencies import (
+    ml_service, behavior_analyzer, session_manager, violation_processor, status_cache, risk_calculator,
+    frame_batcher, violation_buffer, upload_buffers, SessionIdQuery
+)
+from services.frame_batcher import RawFrame
+from services.upload_buffers import UploadTooLargeError
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/v1", tags=["ml"])
+
+@router.post("/process/video-frame")
+async def process_video_frame(
+    session_id: SessionIdQuery,
+    frame: UploadFile = File(...),
+    width: Optional[int] = None,
+    height: Optional[int] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """Process a video frame for violations; pass width and height to send a raw NV12 frame instead of a JPEG."""
+    try:
+        # Validate session
+        session = await session_manager.get_session(db, session_id)
+        if not session:
+            raise HTTPException(status_code=404, detail="Session not found")
+        
+        # Read frame data into a pooled buffer and process it with the ML models
+        # (batched with frames from other requests) before the buffer is handed back
+        async with upload_buffers.read(frame) as frame_data:
+            if width and height:
+                if len(frame_data) != width * height * 3 // 2:
+                    raise HTTPException(status_code=400, detail="Frame size does not match NV12 dimensions")
+                frame_data = RawFrame(frame_data, width, height)
+            violations = await frame_batcher.submit(frame_data, session_id)
+        
+        # Buffer violations; they are written together with other frames' violations on the next flush,
+        # after which the risk score is updated in the background
+        await violation_buffer.add(session_id, violations)
+        
+        return {"violations_detected": len(violations), "processed": True}
+    except HTTPException:
+        raise
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        logger.error(f"Failed to process video frame for session {session_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/process/audio-chunk")
+async def process_audio_chunk(
+    session_id: SessionIdQuery,
+    audio: UploadFile = File(...),
+    db: AsyncSession = Depends(get_db)
+):
+    """Process an audio chunk for violations."""
+    try:
+        # Validate session
+        session = await session_manager.get_session(db, session_id)
+        if not session:
+            raise HTTPException(status_code=404, detail="Session not found")
+        
+        # Read audio data
+        audio_data = await audio.read()
+        
+        # Process with ML models
+        violations = await (await ml_service.get()).process_audio_chunk(audio_data, session_id)
+        
+        # Buffer violations; they are written together with frame and behavior violations on the next flush
+        await violation_buffer.add(session_id, violations)
+        
+        return {"violations_detected": len(violations), "processed": True}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to process audio chunk for session {session_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/process/behavior-event")
+async def process_behavior_event(
+    event_data: schemas.BehaviorEvent,
+    db: AsyncSession = Depends(get_db)
+):
+    """Process a behavior event (mouse, keyboard, browser)."""
+    try:
+        # Validate session
+        session = await session_manager.get_session(db, event_data.session_id)
+        if not session:
+            raise HTTPException(status_code=404, detail="Session not found")
+        
+        # Process event
+        violations = await behavior_analyzer.process_behavior_event(event_data)
+        
+        # Buffer violations; they are written together with other sessions' events on the next flush
+        await violation_buffer.add(event_data.session_id, violations)
+        
+        return {"violations_detected": len(violations), "processed": True}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to process behavior event: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/process/behavior-events")
+async def process_behavior_events(
+    events: List[schemas.BehaviorEvent],
+    db: AsyncSession = Depends(get_db)
+):
+    """Process a batch of behavior events, storing their violations with a single COPY."""
+    try:
+        violations_by_session: Dict[str, List[schemas.ViolationCreate]] = {}
+        for event_data in events:
+            violations = await behavior_analyzer.process_behavior_event(event_data)
+            if violations:
+                violations_by_session.setdefault(event_data.session_id, []).extend(violations)
+        
+        # Store violations (events for unknown sessions are dropped)
+        counts = await violation_processor.copy_violations(db, violations_by_session)
+        # Same follow-up as a buffered flush: bump the cached counts and recalculate risk in the background
+        for session_id, count in counts.items():
+            await status_cache.violations_recorded(session_id, count)
+            if count:
+                risk_calculator.schedule_session_risk_update(session_id)
+        
+        return {"events_processed": len(events), "violations_detected": sum(counts.values()), "processed": True}
+    except Exception as e:
+        logger.error(f"Failed to process behavior events: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Identity Verification
+@router.post("/identity/verify")
+async def verify_identity(
+    verification_data: schemas.IdentityVerification,
+    db: AsyncSession = Depends(get_db)
+):
+    """Verify user identity for proctoring."""
+    try:
+        result = await (await ml_service.get()).verify_identity(verification_data)
+        return result
+    except Exception as e:
+        logger.error(f"Failed to verify identity: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/identity/baseline/{user_id}")
+async def get_identity_baseline(
+    user_id: int,
+    db: AsyncSession = Depends(get_db)
+):
+    """Get identity baseline for a user."""
+    try:
+        baseline = await (await ml_service.get()).get_identity_baseline(db, user_id)
+        return baseline
+    except Exception as e:
+        logger.error(f"Failed to get identity baseline for user {user_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ML Model Status
+@router.get("/ml/models/status")
+async def get_model_status():
+    """Get status of all ML models."""
+    try:
+        if not ml_service.is_loaded:
+            # Reporting status does not trigger the (slow) model load
+            return {"models_loaded": False}
+        status = await (await ml_service.get()).get_model_status()
+        return status
+    except Exception as e:
+        logger.error(f"Failed to get model status: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
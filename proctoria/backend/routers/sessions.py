@@ -0,0 +1,88 @@
+from fastapi import APIRouter, HTTPException, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+import logging
+
+from database import get_db
+from schemas import schemas
+from dependencies import session_manager, status_cache, risk_calculator, SessionIdPath
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/v1", tags=["sessions"])
+
+@router.post("/sessions/start", response_model=schemas.SessionResponse)
+async def start_session(
+    session_data: schemas.SessionCreate,
+    db: AsyncSession = Depends(get_db)
+):
+    """Start a new proctoring session."""
+    try:
+        session = await session_manager.create_session(db, session_data)
+        await status_cache.session_started(session)
+        return schemas.SessionResponse(
+            session_id=session.session_id,
+            status=session.status,
+            message="Session started successfully"
+        )
+    except Exception as e:
+        logger.error(f"Failed to start session: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/sessions/{session_id}/end")
+async def end_session(
+    session_id: SessionIdPath,
+    db: AsyncSession = Depends(get_db)
+):
+    """End a proctoring session."""
+    try:
+        await session_manager.end_session(db, session_id)
+        await status_cache.session_ended(session_id)
+        return {"message": "Session ended successfully"}
+    except Exception as e:
+        logger.error(f"Failed to end session {session_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/sessions/{session_id}/status", response_model=schemas.SessionStatus)
+async def get_session_status(
+    session_id: SessionIdPath,
+    db: AsyncSession = Depends(get_db)
+):
+    """Get current session status and risk score."""
+    try:
+        status = await status_cache.get_status(db, session_id)
+        if not status:
+            raise HTTPException(status_code=404, detail="Session not found")
+        
+        return status
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to get session status {session_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Risk Scoring
+@router.get("/risk-score/{session_id}")
+async def get_risk_score(
+    session_id: SessionIdPath,
+    db: AsyncSession = Depends(get_db)
+):
+    """Get current risk score for a session."""
+    try:
+        risk_score = await risk_calculator.calculate_session_risk(db, session_id)
+        return {"session_id": session_id, "risk_score": risk_score}
+    except Exception as e:
+        logger.error(f"Failed to get risk score for session {session_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/risk-score/{session_id}/recalculate")
+async def recalculate_risk_score(
+    session_id: SessionIdPath,
+    db: AsyncSession = Depends(get_db)
+):
+    """Recalculate risk score for a session."""
+    try:
+        risk_score = await risk_calculator.recalculate_session_risk(db, session_id)
+        return {"session_id": session_id, "risk_score": risk_score, "recalculated": True}
+    except Exception as e:
+        logger.error(f"Failed to recalculate risk score for session {session_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
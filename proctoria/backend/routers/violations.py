@@ -0,0 +1,69 @@
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
+import logging
+
+from database import get_db
+from schemas import schemas
+from dependencies import violation_processor, status_cache, SessionIdPath
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/v1/violations", tags=["violations"])
+
+# Declared before the /{session_id} routes so "summaries" is not taken for a session id
+@router.post("/summaries")
+async def get_violation_summaries(
+    request: schemas.ViolationSummaryRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """Get violation summaries for several sessions at once, keyed by session id."""
+    try:
+        summaries = await violation_processor.get_violation_summaries(db, request.session_ids)
+        return ORJSONResponse(summaries)
+    except Exception as e:
+        logger.error(f"Failed to get violation summaries: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/{session_id}")
+async def create_violation(
+    session_id: SessionIdPath,
+    violation_data: schemas.ViolationCreate,
+    db: AsyncSession = Depends(get_db)
+):
+    """Manually create a violation."""
+    try:
+        violation = await violation_processor.create_violation(db, session_id, violation_data)
+        await status_cache.violations_recorded(session_id, 1)
+        return {"violation_id": violation.id, "created": True}
+    except Exception as e:
+        logger.error(f"Failed to create violation for session {session_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/{session_id}", response_model=List[schemas.ViolationResponse])
+async def get_violations(
+    session_id: SessionIdPath,
+    db: AsyncSession = Depends(get_db)
+):
+    """Get all violations for a session."""
+    try:
+        violations = await violation_processor.get_session_violations(db, session_id)
+        return ORJSONResponse(schemas.ViolationResponseList.dump_python(violations))
+    except Exception as e:
+        logger.error(f"Failed to get violations for session {session_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.put("/{violation_id}/status")
+async def update_violation_status(
+    violation_id: int,
+    status_data: schemas.ViolationStatusUpdate,
+    db: AsyncSession = Depends(get_db)
+):
+    """Update violation status (resolve/unresolve)."""
+    try:
+        await violation_processor.update_violation_status(db, violation_id, status_data.resolved)
+        return {"updated": True}
+    except Exception as e:
+        logger.error(f"Failed to update violation {violation_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
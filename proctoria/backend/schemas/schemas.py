@@ -1,19 +1,36 @@
-from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from pydantic import AfterValidator, BaseModel, ConfigDict, Field, TypeAdapter
+from pydantic.dataclasses import dataclass
+from typing import Annotated, Optional, List, Dict, Any, Union
 from datetime import datetime
 
+# Session IDs are UUIDs stored in a native UUID column; malformed IDs are rejected before reaching the database
+SESSION_ID_PATTERN = r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$"
+
+# Postgres returns UUIDs in lower case, so incoming IDs are lower-cased to match the keys built from its rows
+normalize_session_id = AfterValidator(str.lower)
+SessionId = Annotated[str, Field(pattern=SESSION_ID_PATTERN), normalize_session_id]
+
+class BaseSchema(BaseModel):
+    """Base for all schemas; allows building them directly from ORM objects."""
+    model_config = ConfigDict(from_attributes=True, extra="ignore")
+
+# Response-only schemas on hot read paths are slotted pydantic dataclasses (no per-instance __dict__)
+response_schema = dataclass(slots=True, config=ConfigDict(extra="ignore"))
+
 # Session Schemas
-class SessionCreate(BaseModel):
+class SessionCreate(BaseSchema):
     user_id: int
     quiz_id: int
     attempt_id: int
 
-class SessionResponse(BaseModel):
+@response_schema
+class SessionResponse:
     session_id: str
     status: str
     message: str
 
-class SessionStatus(BaseModel):
+@response_schema
+class SessionStatus:
     session_id: str
     status: str
     risk_score: float
@@ -22,81 +39,87 @@ class SessionStatus(BaseModel):
     last_activity: datetime
 
 # Violation Schemas
-class ViolationCreate(BaseModel):
+class ViolationCreate(BaseSchema):
     type: str
     confidence: float
-    details: Optional[str] = None
+    details: Optional[Union[str, Dict[str, Any]]] = None
     screenshot_url: Optional[str] = None
 
-class ViolationResponse(BaseModel):
+class ViolationResponse(BaseSchema):
     id: int
     type: str
     confidence: float
-    details: Optional[str]
+    details: Optional[Union[str, Dict[str, Any]]]
     screenshot_url: Optional[str]
     resolved: bool
     timecreated: datetime
 
-class ViolationStatusUpdate(BaseModel):
+# Validates and serializes whole violation lists in one call
+ViolationResponseList = TypeAdapter(List[ViolationResponse])
+
+class ViolationStatusUpdate(BaseSchema):
     resolved: bool
 
+class ViolationSummaryRequest(BaseSchema):
+    session_ids: List[SessionId] = Field(max_length=500)
+
 # Behavior Event Schema
-class BehaviorEvent(BaseModel):
-    session_id: str
+class BehaviorEvent(BaseSchema):
+    session_id: SessionId
     event_type: str  # 'mouse', 'keyboard', 'browser', 'tab_switch', etc.
     event_data: Dict[str, Any]
     timestamp: datetime
 
 # Identity Verification Schema
-class IdentityVerification(BaseModel):
+class IdentityVerification(BaseSchema):
     user_id: int
     image_data: str  # base64 encoded image
     verification_type: str  # 'face', 'id_document'
 
-class IdentityBaseline(BaseModel):
+class IdentityBaseline(BaseSchema):
     user_id: int
     face_encoding: Optional[str]
     voice_print: Optional[str]
     verification_status: str
 
 # Analytics Schemas
-class AnalyticsMetric(BaseModel):
+class AnalyticsMetric(BaseSchema):
     session_id: str
     question_id: Optional[int]
     metric_type: str
-    metric_value: str
+    metric_value: Any
 
 # ML Processing Schemas
-class MLProcessingResult(BaseModel):
+class MLProcessingResult(BaseSchema):
     violations: List[ViolationCreate]
     confidence_scores: Dict[str, float]
     processed_timestamp: datetime
 
-class FaceDetectionResult(BaseModel):
+class FaceDetectionResult(BaseSchema):
     faces_detected: int
     identity_match: bool
     identity_confidence: float
     expression_data: Dict[str, Any]
 
-class ObjectDetectionResult(BaseModel):
+class ObjectDetectionResult(BaseSchema):
     objects_detected: List[Dict[str, Any]]
     prohibited_items: List[str]
     confidence_scores: Dict[str, float]
 
-class AudioAnalysisResult(BaseModel):
+class AudioAnalysisResult(BaseSchema):
     voice_detected: bool
     speaker_count: int
     suspicious_keywords: List[str]
     noise_level: float
 
 # Plagiarism Schemas
-class PlagiarismSubmission(BaseModel):
+class PlagiarismSubmission(BaseSchema):
     session_id: str
     question_id: int
     code_content: str
     language: str
 
-class PlagiarismResult(BaseModel):
+class PlagiarismResult(BaseSchema):
     similarity_score: float
     matches_found: int
     report_url: Optional[str]
@@ -0,0 +1,38 @@
+import logging
+from typing import List
+
+from schemas.schemas import ViolationCreate
+
+logger = logging.getLogger(__name__)
+
+class BehaviorAnalyzer:
+    """Turns browser behavior events (mouse, keyboard, browser) into violations."""
+
+    async def process_behavior_event(self, event_data) -> List[ViolationCreate]:
+        """Process behavior events (mouse, keyboard, browser)."""
+        violations = []
+        
+        try:
+            if event_data.event_type == "tab_switch":
+                violations.append(ViolationCreate(
+                    type="tab_switch",
+                    confidence=0.9,
+                    details="Student switched browser tabs"
+                ))
+            elif event_data.event_type == "copy_paste":
+                violations.append(ViolationCreate(
+                    type="copy_paste",
+                    confidence=0.95,
+                    details="Copy-paste activity detected"
+                ))
+            elif event_data.event_type == "dev_tools":
+                violations.append(ViolationCreate(
+                    type="developer_tools",
+                    confidence=1.0,
+                    details="Developer tools opened"
+                ))
+            
+        except Exception as e:
+            logger.error(f"Error processing behavior event: {str(e)}")
+        
+        return violations
@@ -0,0 +1,120 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Deque, List, NamedTuple, Optional
+
+from schemas.schemas import ViolationCreate
+from services.lazy import Lazy
+
+logger = logging.getLogger(__name__)
+
+class RawFrame(NamedTuple):
+    """An uncompressed NV12 frame (width * height * 3 / 2 bytes) sent instead of a JPEG."""
+    data: bytes
+    width: int
+    height: int
+
+class FrameBatcher:
+    """Collects video frames from concurrent requests and runs them through the ML models in batches."""
+
+    def __init__(self, ml_service: Lazy, max_batch_size: int = 16, max_wait_ms: int = 10):
+        self.ml_service = ml_service
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        # Frames wait in a plain deque and the worker only waits on an event: a timed-out wait on the event
+        # cannot take a frame with it, which a cancelled Queue.get() can do
+        self._pending: Deque[tuple] = deque()
+        self._frame_added: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Start the background batching task."""
+        if self._worker is None:
+            self._frame_added = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+            logger.info(f"Frame batcher started (max batch size {self.max_batch_size})")
+
+    async def stop(self):
+        """Stop the background batching task."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        # Frames that were never batched would otherwise leave their requests waiting forever
+        while self._pending:
+            _, _, future = self._pending.popleft()
+            if not future.done():
+                future.cancel()
+
+    async def submit(self, frame_data: bytes, session_id: str) -> List[ViolationCreate]:
+        """Queue a frame for processing and wait for its violations."""
+        if self._worker is None:
+            ml_service = await self.ml_service.get()
+            return await ml_service.process_video_frame(frame_data, session_id)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((frame_data, session_id, future))
+        self._frame_added.set()
+        return await future
+
+    async def _wait_for_frame(self, timeout: Optional[float] = None) -> bool:
+        """Wait until a frame is pending; returns False if the timeout passes first."""
+        while not self._pending:
+            self._frame_added.clear()
+            try:
+                await asyncio.wait_for(self._frame_added.wait(), timeout)
+            except asyncio.TimeoutError:
+                return bool(self._pending)
+        return True
+
+    async def _collect_batch(self) -> list:
+        """Wait for one frame, then gather more until the batch is full or the wait window closes."""
+        await self._wait_for_frame()
+        items = [self._pending.popleft()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+
+        while len(items) < self.max_batch_size:
+            if self._pending:
+                items.append(self._pending.popleft())
+                continue
+
+            timeout = deadline - loop.time()
+            try:
+                if timeout <= 0 or not await self._wait_for_frame(timeout):
+                    break
+            except asyncio.CancelledError:
+                # Stopping mid-collection: put the taken frames back so stop() can resolve them
+                self._pending.extendleft(reversed(items))
+                raise
+
+        return items
+
+    async def _run(self):
+        """Drain the pending frames and process them batch by batch."""
+        while True:
+            items = await self._collect_batch()
+            frames = [frame_data for frame_data, _, _ in items]
+            session_ids = [session_id for _, session_id, _ in items]
+
+            try:
+                # The first batch waits for the models to load in a worker thread
+                ml_service = await self.ml_service.get()
+                results = await ml_service.process_video_frame_batch(frames, session_ids)
+                for (_, _, future), violations in zip(items, results):
+                    if not future.done():
+                        future.set_result(violations)
+            except asyncio.CancelledError:
+                for _, _, future in items:
+                    if not future.done():
+                        future.cancel()
+                raise
+            except Exception as e:
+                logger.error(f"Failed to process frame batch of size {len(items)}: {str(e)}")
+                for _, _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
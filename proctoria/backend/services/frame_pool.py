@@ -0,0 +1,29 @@
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+class FramePool:
+    """Reusable (height, width, 3) uint8 buffers for decoded frames, keyed by resolution."""
+
+    def __init__(self, max_per_shape: int = 16):
+        self.max_per_shape = max_per_shape
+        self._free: Dict[Tuple[int, int], List[np.ndarray]] = {}
+        # Frames are decoded on executor threads
+        self._lock = threading.Lock()
+
+    def take(self, height: int, width: int) -> np.ndarray:
+        """Get a buffer for a frame of the given size, allocating one if none is free."""
+        with self._lock:
+            free = self._free.get((height, width))
+            if free:
+                return free.pop()
+        return np.empty((height, width, 3), dtype=np.uint8)
+
+    def release(self, buffers: Iterable[np.ndarray]):
+        """Hand buffers back once nothing reads them any more."""
+        with self._lock:
+            for buffer in buffers:
+                free = self._free.setdefault(buffer.shape[:2], [])
+                if len(free) < self.max_per_shape:
+                    free.append(buffer)
@@ -0,0 +1,51 @@
+import asyncio
+import importlib
+import threading
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+class Lazy:
+    """Imports and constructs a service on first use, off the event loop."""
+
+    def __init__(self, module_path: str, class_name: str):
+        self._module_path = module_path
+        self._class_name = class_name
+        self._instance = None
+        self._lock = threading.Lock()
+        self._loading: Optional[asyncio.Future] = None
+
+    @property
+    def is_loaded(self) -> bool:
+        """Whether the wrapped service has been constructed."""
+        return self._instance is not None
+
+    def load(self):
+        """Construct the wrapped service if needed and return it (blocks; call from a worker thread)."""
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    module = importlib.import_module(self._module_path)
+                    self._instance = getattr(module, self._class_name)()
+                    logger.info(f"Loaded {self._class_name}")
+        return self._instance
+
+    async def get(self):
+        """Return the wrapped service, loading it in a worker thread so the event loop keeps serving."""
+        if self._instance is not None:
+            return self._instance
+
+        # Concurrent callers wait on the same load instead of each tying up an executor thread
+        if self._loading is None:
+            self._loading = asyncio.get_running_loop().run_in_executor(None, self.load)
+        loading = self._loading
+        try:
+            return await asyncio.shield(loading)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Let the next caller retry a failed load
+            if self._loading is loading:
+                self._loading = None
+            raise
@@ -1,56 +1,75 @@
 import cv2
 import numpy as np
 import mediapipe as mp
+import torch
+import simplejpeg
 from ultralytics import YOLO
 import base64
 import io
 from PIL import Image
 import json
 import logging
+import os
 from typing import List, Dict, Any, Optional
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
 
 from schemas.schemas import ViolationCreate, FaceDetectionResult, ObjectDetectionResult, AudioAnalysisResult
 from config import settings
+from services.frame_batcher import RawFrame
+from services.frame_pool import FramePool
 
 logger = logging.getLogger(__name__)
 
+# Fixed values reported until real expression and gaze analysis is wired in
+PLACEHOLDER_EXPRESSION_DATA = {"stress_level": 0.5, "focus_level": 0.5}
+PLACEHOLDER_GAZE_ON_SCREEN = 0.85
+
+# Face Mesh reports at most this many faces, so face counts in violation details are capped at it
+MAX_DETECTED_FACES = 5
+
 class MLService:
     def __init__(self):
-        self.executor = ThreadPoolExecutor(max_workers=4)
+        # A single worker runs the models back-to-back; they share one GPU and contend for the GIL,
+        # so fanning frames out over several threads did not add parallelism
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ml")
+        # Decoded frames are written into reused buffers and handed back once a batch is processed
+        self.frame_pool = FramePool(max_per_shape=settings.frame_batch_max_size)
         self._initialize_models()
     
     def _initialize_models(self):
         """Initialize all ML models."""
         try:
-            # MediaPipe Face Detection
-            self.mp_face_detection = mp.solutions.face_detection
+            # MediaPipe Face Mesh with iris landmarks; its faces are used both for face counting and
+            # gaze tracking. Batches mix frames from every session, so each frame is processed on its
+            # own instead of tracking faces across frames
             self.mp_drawing = mp.solutions.drawing_utils
-            self.face_detection = self.mp_face_detection.FaceDetection(
-                model_selection=0, min_detection_confidence=0.5
-            )
-            
-            # MediaPipe Face Mesh for gaze tracking
             self.mp_face_mesh = mp.solutions.face_mesh
             self.face_mesh = self.mp_face_mesh.FaceMesh(
-                max_num_faces=2,
+                static_image_mode=True,
+                max_num_faces=MAX_DETECTED_FACES,
                 refine_landmarks=True,
                 min_detection_confidence=0.5,
                 min_tracking_confidence=0.5
             )
             
-            # MediaPipe Pose Detection
+            # MediaPipe Pose Detection, also run on each frame independently of the session's previous ones
             self.mp_pose = mp.solutions.pose
             self.pose = self.mp_pose.Pose(
-                static_image_mode=False,
+                static_image_mode=True,
                 model_complexity=1,
                 enable_segmentation=False,
                 min_detection_confidence=0.5
             )
             
-            # YOLO Object Detection
-            self.yolo_model = YOLO('yolov8n.pt')
+            # YOLO Object Detection (on the GPU in FP16 when one is available)
+            self.device = self._select_device()
+            self.half_precision = settings.ml_half_precision and self.device != "cpu"
+            object_detection_model = self._object_detection_model_path()
+            self.yolo_model = YOLO(object_detection_model, task="detect")
+            if object_detection_model.endswith(".pt"):
+                # Exported models (TensorRT, OpenVINO) are already bound to the device they were built for
+                self.yolo_model.to(self.device)
             
             # Prohibited items to detect
             self.prohibited_objects = {
@@ -60,143 +79,214 @@ class MLService:
                 'tablet': 0.8,
                 'person': 0.6  # Additional person
             }
+            # Per-class confidence thresholds indexed by YOLO class id (never reached for allowed classes)
+            self.prohibited_thresholds = np.full(len(self.yolo_model.names), np.inf, dtype=np.float32)
+            for class_id, class_name in self.yolo_model.names.items():
+                if class_name in self.prohibited_objects:
+                    self.prohibited_thresholds[class_id] = self.prohibited_objects[class_name]
             
-            logger.info("ML models initialized successfully")
+            logger.info(f"ML models initialized successfully (object detection on {self.device})")
             
         except Exception as e:
             logger.error(f"Failed to initialize ML models: {str(e)}")
             raise
     
+    def _object_detection_model_path(self) -> str:
+        """Return the object detection weights, exporting an optimized model first if enabled."""
+        model_path = settings.object_detection_model
+        if not model_path.endswith(".pt"):
+            return model_path
+        
+        if self.device == "cpu" and settings.ml_int8_calibration_data:
+            # INT8 model calibrated on representative frames; uses VNNI on CPUs that have it
+            int8_path = os.path.splitext(model_path)[0] + "_int8_openvino_model"
+            if not os.path.isdir(int8_path):
+                logger.info(f"Exporting {model_path} to INT8 OpenVINO model {int8_path}")
+                YOLO(model_path).export(
+                    format="openvino", int8=True, data=settings.ml_int8_calibration_data, imgsz=640
+                )
+            return int8_path
+        
+        if not settings.ml_tensorrt or self.device == "cpu":
+            return model_path
+        
+        engine_path = os.path.splitext(model_path)[0] + ".engine"
+        if not os.path.exists(engine_path):
+            # One-off export; the engine takes batches up to the frame batcher's size
+            logger.info(f"Exporting {model_path} to TensorRT engine {engine_path}")
+            exported_path = YOLO(model_path).export(
+                format="engine",
+                imgsz=640,
+                half=self.half_precision,
+                dynamic=True,
+                batch=settings.frame_batch_max_size,
+                device=self.device
+            )
+            if exported_path != engine_path:
+                os.replace(exported_path, engine_path)
+        return engine_path
+    
+    def _select_device(self) -> str:
+        """Pick the device for model inference."""
+        if settings.ml_device != "auto":
+            return settings.ml_device
+        return "cuda:0" if torch.cuda.is_available() else "cpu"
+    
     async def process_video_frame(self, frame_data: bytes, session_id: str) -> List[ViolationCreate]:
         """Process a video frame and detect violations."""
+        results = await self.process_video_frame_batch([frame_data], [session_id])
+        return results[0]
+    
+    async def process_video_frame_batch(self, frames: List[bytes], session_ids: List[str]) -> List[List[ViolationCreate]]:
+        """Process a batch of video frames on the ML worker thread."""
         try:
-            # Decode image
-            image = self._decode_image(frame_data)
-            
-            # Run all detections in parallel
-            face_task = asyncio.create_task(
-                asyncio.get_event_loop().run_in_executor(
-                    self.executor, self._detect_faces, image
-                )
-            )
-            object_task = asyncio.create_task(
-                asyncio.get_event_loop().run_in_executor(
-                    self.executor, self._detect_objects, image
-                )
-            )
-            pose_task = asyncio.create_task(
-                asyncio.get_event_loop().run_in_executor(
-                    self.executor, self._analyze_pose, image
-                )
-            )
-            gaze_task = asyncio.create_task(
-                asyncio.get_event_loop().run_in_executor(
-                    self.executor, self._analyze_gaze, image
-                )
-            )
-            
-            # Wait for all tasks to complete
-            face_result, object_result, pose_result, gaze_result = await asyncio.gather(
-                face_task, object_task, pose_task, gaze_task
-            )
-            
-            # Combine results into violations
-            violations = []
-            violations.extend(self._process_face_violations(face_result))
-            violations.extend(self._process_object_violations(object_result))
-            violations.extend(self._process_pose_violations(pose_result))
-            violations.extend(self._process_gaze_violations(gaze_result))
-            
-            return violations
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(self.executor, self._process_frame_batch, frames, session_ids)
             
         except Exception as e:
-            logger.error(f"Error processing video frame for session {session_id}: {str(e)}")
-            return []
+            logger.error(f"Error processing video frame batch for sessions {', '.join(set(session_ids))}: {str(e)}")
+            return [[] for _ in frames]
+    
+    def _process_frame_batch(self, frames: List[bytes], session_ids: List[str]) -> List[List[ViolationCreate]]:
+        """Decode a batch of frames and run all detectors over it back-to-back."""
+        batch_violations = [[] for _ in frames]
+        
+        # Decode images, skipping frames that cannot be decoded
+        images = {}
+        for index, (frame_data, session_id) in enumerate(zip(frames, session_ids)):
+            try:
+                images[index] = self._decode_image(frame_data)
+            except Exception as e:
+                logger.error(f"Error decoding video frame for session {session_id}: {str(e)}")
+        
+        if not images:
+            return batch_violations
+        
+        try:
+            # Run object detection on the whole batch in a single model call
+            object_results = self._detect_objects_batch(list(images.values()))
+            
+            # Run the per-frame detections and combine results into violations
+            for (index, image), object_result in zip(images.items(), object_results):
+                violations = batch_violations[index]
+                face_mesh_results = self._run_face_mesh(image)
+                face_result = self._detect_faces(face_mesh_results)
+                violations.extend(self._process_face_violations(face_result))
+                violations.extend(self._process_object_violations(object_result))
+                violations.extend(self._process_pose_violations(self._analyze_pose(image)))
+                violations.extend(self._process_gaze_violations(self._analyze_gaze(face_mesh_results)))
+            
+            return batch_violations
+        finally:
+            # Nothing else reads the frames once this batch is done, so their buffers can be reused
+            self.frame_pool.release(images.values())
     
-    def _decode_image(self, frame_data: bytes) -> np.ndarray:
-        """Decode image data to OpenCV format."""
+    def _decode_image(self, frame_data) -> np.ndarray:
+        """Decode image data (JPEG, another cv2 format, or a raw NV12 frame) into a pooled RGB buffer."""
+        if isinstance(frame_data, RawFrame):
+            # Uncompressed NV12 from clients that skip JPEG encoding: a single color conversion
+            yuv = np.frombuffer(frame_data.data, np.uint8).reshape(frame_data.height * 3 // 2, frame_data.width)
+            buffer = self.frame_pool.take(frame_data.height, frame_data.width)
+            cv2.cvtColor(yuv, cv2.COLOR_YUV2RGB_NV12, dst=buffer)
+            return buffer
+        
+        if simplejpeg.is_jpeg(frame_data):
+            # libjpeg-turbo decodes straight to RGB, skipping the BGR conversion
+            height, width, _, _ = simplejpeg.decode_jpeg_header(frame_data)
+            buffer = self.frame_pool.take(height, width)
+            simplejpeg.decode_jpeg(frame_data, colorspace="RGB", fastdct=True, buffer=buffer)
+            return buffer
+        
         nparr = np.frombuffer(frame_data, np.uint8)
         image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        buffer = self.frame_pool.take(image.shape[0], image.shape[1])
+        cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=buffer)
+        return buffer
     
-    def _detect_faces(self, image: np.ndarray) -> FaceDetectionResult:
-        """Detect faces in the image."""
+    def _run_face_mesh(self, image: np.ndarray):
+        """Run MediaPipe Face Mesh over the image, returning None if it fails."""
         try:
-            results = self.face_detection.process(image)
-            
-            faces_detected = 0
-            if results.detections:
-                faces_detected = len(results.detections)
-            
-            # For identity matching, we would compare with stored baseline
-            # This is simplified for the demo
-            identity_match = faces_detected == 1
-            identity_confidence = 0.95 if identity_match else 0.3
-            
-            # Expression analysis (simplified)
-            expression_data = {
-                "stress_level": np.random.uniform(0, 1),
-                "focus_level": np.random.uniform(0, 1)
-            }
-            
-            return FaceDetectionResult(
-                faces_detected=faces_detected,
-                identity_match=identity_match,
-                identity_confidence=identity_confidence,
-                expression_data=expression_data
-            )
-            
+            return self.face_mesh.process(image)
         except Exception as e:
-            logger.error(f"Face detection error: {str(e)}")
+            logger.error(f"Face mesh error: {str(e)}")
+            return None
+    
+    def _detect_faces(self, face_mesh_results) -> FaceDetectionResult:
+        """Detect faces from the Face Mesh results."""
+        if face_mesh_results is None:
             return FaceDetectionResult(
                 faces_detected=0,
                 identity_match=False,
                 identity_confidence=0.0,
                 expression_data={}
             )
+        
+        faces_detected = len(face_mesh_results.multi_face_landmarks or ())
+        
+        # For identity matching, we would compare with stored baseline
+        # This is simplified for the demo
+        identity_match = faces_detected == 1
+        identity_confidence = 0.95 if identity_match else 0.3
+        
+        return FaceDetectionResult(
+            faces_detected=faces_detected,
+            identity_match=identity_match,
+            identity_confidence=identity_confidence,
+            expression_data=dict(PLACEHOLDER_EXPRESSION_DATA)
+        )
     
     def _detect_objects(self, image: np.ndarray) -> ObjectDetectionResult:
         """Detect objects in the image."""
+        return self._detect_objects_batch([image])[0]
+    
+    def _detect_objects_batch(self, images: List[np.ndarray]) -> List[ObjectDetectionResult]:
+        """Detect objects in a batch of images with a single model call."""
         try:
-            results = self.yolo_model(image)
-            
-            objects_detected = []
-            prohibited_items = []
-            confidence_scores = {}
-            
-            for result in results:
-                for box in result.boxes:
-                    class_id = int(box.cls)
-                    class_name = self.yolo_model.names[class_id]
-                    confidence = float(box.conf)
-                    
-                    objects_detected.append({
-                        "class": class_name,
-                        "confidence": confidence,
-                        "bbox": box.xyxy.tolist()
-                    })
-                    
-                    # Check if it's a prohibited item
-                    if class_name in self.prohibited_objects:
-                        threshold = self.prohibited_objects[class_name]
-                        if confidence >= threshold:
-                            prohibited_items.append(class_name)
-                    
-                    confidence_scores[class_name] = confidence
-            
-            return ObjectDetectionResult(
-                objects_detected=objects_detected,
-                prohibited_items=prohibited_items,
-                confidence_scores=confidence_scores
+            results = self.yolo_model(
+                images, device=self.device, half=self.half_precision, verbose=False
             )
+            return [self._parse_object_result(result) for result in results]
             
         except Exception as e:
             logger.error(f"Object detection error: {str(e)}")
-            return ObjectDetectionResult(
-                objects_detected=[],
-                prohibited_items=[],
-                confidence_scores={}
-            )
+            return [
+                ObjectDetectionResult(
+                    objects_detected=[],
+                    prohibited_items=[],
+                    confidence_scores={}
+                )
+                for _ in images
+            ]
+    
+    def _parse_object_result(self, result) -> ObjectDetectionResult:
+        """Convert a single YOLO result into an object detection result."""
+        # Copy the box tensors off the device once and threshold them together
+        class_ids = result.boxes.cls.cpu().numpy().astype(np.intp)
+        confidences = result.boxes.conf.cpu().numpy()
+        # Each bbox keeps the [[x1, y1, x2, y2]] shape a single box's xyxy has
+        bboxes = result.boxes.xyxy.cpu().numpy().reshape(-1, 1, 4).tolist()
+        
+        names = self.yolo_model.names
+        class_names = [names[class_id] for class_id in class_ids.tolist()]
+        confidence_values = confidences.tolist()
+        
+        objects_detected = [
+            {"class": class_name, "confidence": confidence, "bbox": bbox}
+            for class_name, confidence, bbox in zip(class_names, confidence_values, bboxes)
+        ]
+        
+        # Prohibited items are the boxes at or above their class threshold
+        prohibited = confidences >= self.prohibited_thresholds[class_ids]
+        prohibited_items = [names[class_id] for class_id in class_ids[prohibited].tolist()]
+        
+        # Later boxes of the same class overwrite earlier ones, as before
+        confidence_scores = dict(zip(class_names, confidence_values))
+        
+        return ObjectDetectionResult(
+            objects_detected=objects_detected,
+            prohibited_items=prohibited_items,
+            confidence_scores=confidence_scores
+        )
     
     def _analyze_pose(self, image: np.ndarray) -> Dict[str, Any]:
         """Analyze body pose and posture."""
@@ -229,29 +319,19 @@ class MLService:
             logger.error(f"Pose analysis error: {str(e)}")
             return {"pose_detected": False}
     
-    def _analyze_gaze(self, image: np.ndarray) -> Dict[str, Any]:
-        """Analyze gaze direction and eye tracking."""
-        try:
-            results = self.face_mesh.process(image)
-            
-            if not results.multi_face_landmarks:
-                return {"gaze_detected": False}
-            
-            # Simplified gaze analysis
-            # In a real implementation, this would use eye landmarks to calculate gaze direction
-            gaze_on_screen = np.random.uniform(0.7, 1.0)  # Placeholder
-            gaze_deviation = 1.0 - gaze_on_screen
-            
-            return {
-                "gaze_detected": True,
-                "gaze_on_screen": gaze_on_screen,
-                "gaze_deviation": gaze_deviation,
-                "eye_movement_pattern": "normal"
-            }
-            
-        except Exception as e:
-            logger.error(f"Gaze analysis error: {str(e)}")
+    def _analyze_gaze(self, face_mesh_results) -> Dict[str, Any]:
+        """Analyze gaze direction and eye tracking from the Face Mesh results."""
+        if face_mesh_results is None or not face_mesh_results.multi_face_landmarks:
             return {"gaze_detected": False}
+        
+        # Simplified gaze analysis
+        # In a real implementation, this would use eye landmarks to calculate gaze direction
+        return {
+            "gaze_detected": True,
+            "gaze_on_screen": PLACEHOLDER_GAZE_ON_SCREEN,
+            "gaze_deviation": 1.0 - PLACEHOLDER_GAZE_ON_SCREEN,
+            "eye_movement_pattern": "normal"
+        }
     
     def _process_face_violations(self, face_result: FaceDetectionResult) -> List[ViolationCreate]:
         """Process face detection results into violations."""
@@ -264,10 +344,12 @@ class MLService:
                 details="No face detected in frame"
             ))
         elif face_result.faces_detected > 1:
+            # Face Mesh stops counting at MAX_DETECTED_FACES, so a full count may mean more faces
+            at_least = "At least " if face_result.faces_detected >= MAX_DETECTED_FACES else ""
             violations.append(ViolationCreate(
                 type="multiple_faces",
                 confidence=0.8,
-                details=f"{face_result.faces_detected} faces detected"
+                details=f"{at_least}{face_result.faces_detected} faces detected"
             ))
         
         if not face_result.identity_match and face_result.faces_detected > 0:
@@ -358,35 +440,6 @@ class MLService:
             logger.error(f"Error processing audio for session {session_id}: {str(e)}")
             return []
     
-    async def process_behavior_event(self, event_data) -> List[ViolationCreate]:
-        """Process behavior events (mouse, keyboard, browser)."""
-        violations = []
-        
-        try:
-            if event_data.event_type == "tab_switch":
-                violations.append(ViolationCreate(
-                    type="tab_switch",
-                    confidence=0.9,
-                    details="Student switched browser tabs"
-                ))
-            elif event_data.event_type == "copy_paste":
-                violations.append(ViolationCreate(
-                    type="copy_paste",
-                    confidence=0.95,
-                    details="Copy-paste activity detected"
-                ))
-            elif event_data.event_type == "dev_tools":
-                violations.append(ViolationCreate(
-                    type="developer_tools",
-                    confidence=1.0,
-                    details="Developer tools opened"
-                ))
-            
-        except Exception as e:
-            logger.error(f"Error processing behavior event: {str(e)}")
-        
-        return violations
-    
     async def verify_identity(self, verification_data) -> Dict[str, Any]:
         """Verify user identity."""
         try:
@@ -1,164 +1,212 @@
-from sqlalchemy.orm import Session
-from models.models import Violation, ProctoringSession
-from datetime import datetime, timedelta
+from sqlalchemy import case, extract, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.models import Violation, ProctoringSession, VIOLATION_TYPES, VIOLATION_TYPE_IDS
+from database import SessionLocal
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Set
+import asyncio
 import logging
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
+# Violation weights for risk calculation
+VIOLATION_WEIGHTS = {
+    'face_not_detected': 0.8,
+    'multiple_faces': 0.9,
+    'identity_mismatch': 0.95,
+    'cell_phone_detected': 0.7,
+    'book_detected': 0.6,
+    'laptop_detected': 0.9,
+    'person_detected': 0.8,
+    'poor_posture': 0.3,
+    'gaze_deviation': 0.4,
+    'tab_switch': 0.5,
+    'copy_paste': 0.9,
+    'developer_tools': 1.0,
+    'multiple_speakers': 0.8,
+    'suspicious_audio': 0.8,
+}
+DEFAULT_VIOLATION_WEIGHT = 0.5
+
+# Weights indexed by violations.type_id (index 0 is for unknown types)
+VIOLATION_WEIGHTS_BY_TYPE_ID = np.array(
+    [DEFAULT_VIOLATION_WEIGHT] + [VIOLATION_WEIGHTS.get(violation_type, DEFAULT_VIOLATION_WEIGHT) for violation_type in VIOLATION_TYPES],
+    dtype=np.float32
+)
+
+# Violations lose impact after 1 hour: linear decay from 1.0 to 0.1 over that time
+TIME_DECAY_HOURS = 1.0
+DECAY_PER_SECOND = 0.9 / (TIME_DECAY_HOURS * 3600)
+
+def violation_weight_expression():
+    """SQL expression for a single violation's type weight times its confidence."""
+    base_weight = case(
+        {VIOLATION_TYPE_IDS[violation_type]: weight for violation_type, weight in VIOLATION_WEIGHTS.items()},
+        value=Violation.type_id,
+        else_=DEFAULT_VIOLATION_WEIGHT
+    )
+    return base_weight * Violation.confidence
+
+def violation_risk_expression():
+    """SQL expression for a single violation's weighted, time-decayed risk contribution."""
+    seconds_elapsed = extract("epoch", func.now() - Violation.timecreated)
+    time_decay = func.greatest(0.1, 1.0 - DECAY_PER_SECOND * seconds_elapsed)
+    return violation_weight_expression() * time_decay
+
+def apply_frequency_penalty(total_risk: float, violation_count: int) -> float:
+    """Scale summed violation risk by frequency (more violations = higher risk) and normalize to 0-1."""
+    frequency_multiplier = min(1.0 + (violation_count * 0.1), 2.0)
+    return min(total_risk * frequency_multiplier, 1.0)
+
 class RiskCalculator:
     """Calculates risk scores based on violations and behavior patterns."""
     
-    def __init__(self):
-        # Violation weights for risk calculation
-        self.violation_weights = {
-            'face_not_detected': 0.8,
-            'multiple_faces': 0.9,
-            'identity_mismatch': 0.95,
-            'cell_phone_detected': 0.7,
-            'book_detected': 0.6,
-            'laptop_detected': 0.9,
-            'person_detected': 0.8,
-            'poor_posture': 0.3,
-            'gaze_deviation': 0.4,
-            'tab_switch': 0.5,
-            'copy_paste': 0.9,
-            'developer_tools': 1.0,
-            'multiple_speakers': 0.8,
-            'suspicious_audio': 0.8,
-        }
+    def __init__(self, status_cache=None):
+        # Live session state cache, updated whenever a new risk score is stored
+        self.status_cache = status_cache
+        
+        # Violation weights for risk calculation, by type and by stored type id
+        self.violation_weights = VIOLATION_WEIGHTS
+        self._weights_arr = VIOLATION_WEIGHTS_BY_TYPE_ID
         
         # Time decay factor for violations
-        self.time_decay_hours = 1.0  # Violations lose impact after 1 hour
+        self.time_decay_hours = TIME_DECAY_HOURS
+        
+        # Background risk updates, at most one running per session
+        self._update_tasks: Dict[str, asyncio.Task] = {}
+        self._update_requested: Set[str] = set()
     
-    async def calculate_session_risk(self, db: Session, session_id: str) -> float:
+    async def _get_session(self, db: AsyncSession, session_id: str) -> ProctoringSession:
+        """Get a session by its external ID."""
+        result = await db.execute(
+            select(ProctoringSession).where(ProctoringSession.session_id == session_id)
+        )
+        return result.scalars().first()
+    
+    async def calculate_session_risk(self, db: AsyncSession, session_id: str) -> float:
         """Calculate current risk score for a session."""
         try:
-            session = db.query(ProctoringSession).filter(
-                ProctoringSession.session_id == session_id
-            ).first()
+            # Sum weighted, time-decayed risk of unresolved violations in the database
+            result = await db.execute(
+                select(
+                    func.coalesce(func.sum(violation_risk_expression()), 0.0),
+                    func.count(Violation.id)
+                )
+                .join(ProctoringSession, Violation.session_id == ProctoringSession.id)
+                .where(
+                    ProctoringSession.session_id == session_id,
+                    Violation.resolved == False
+                )
+            )
+            total_risk, violation_count = result.one()
             
-            if not session:
+            if not violation_count:
                 return 0.0
             
-            violations = db.query(Violation).filter(
-                Violation.session_id == session.id,
-                Violation.resolved == False
-            ).all()
-            
-            if not violations:
-                return 0.0
+            # Apply frequency penalty and normalize to 0-1 range
+            final_risk = apply_frequency_penalty(total_risk, violation_count)
             
-            total_risk = 0.0
-            current_time = datetime.utcnow()
-            
-            for violation in violations:
-                # Get base weight for violation type
-                base_weight = self.violation_weights.get(violation.type, 0.5)
-                
-                # Apply confidence multiplier
-                confidence_multiplier = violation.confidence
-                
-                # Apply time decay
-                time_diff = current_time - violation.timecreated
-                time_decay = self._calculate_time_decay(time_diff)
-                
-                # Calculate violation risk contribution
-                violation_risk = base_weight * confidence_multiplier * time_decay
-                total_risk += violation_risk
-            
-            # Apply frequency penalty (more violations = higher risk)
-            frequency_multiplier = min(1.0 + (len(violations) * 0.1), 2.0)
-            total_risk *= frequency_multiplier
-            
-            # Normalize to 0-1 range
-            final_risk = min(total_risk, 1.0)
-            
-            logger.debug(f"Calculated risk score {final_risk} for session {session_id}")
+            logger.debug("Calculated risk score %s for session %s", final_risk, session_id)
             return final_risk
             
         except Exception as e:
             logger.error(f"Failed to calculate risk score for session {session_id}: {str(e)}")
             return 0.0
     
-    def _calculate_time_decay(self, time_diff: timedelta) -> float:
-        """Calculate time decay factor for violations."""
-        hours_elapsed = time_diff.total_seconds() / 3600
-        if hours_elapsed >= self.time_decay_hours:
-            return 0.1  # Minimum impact after decay period
-        else:
-            # Linear decay from 1.0 to 0.1
-            return 1.0 - (0.9 * hours_elapsed / self.time_decay_hours)
-    
-    async def update_session_risk(self, db: Session, session_id: str):
+    async def update_session_risk(self, db: AsyncSession, session_id: str):
         """Update stored risk score for a session."""
         try:
-            session = db.query(ProctoringSession).filter(
-                ProctoringSession.session_id == session_id
-            ).first()
+            new_risk_score = await self.calculate_session_risk(db, session_id)
+            status = await db.scalar(
+                update(ProctoringSession)
+                .where(ProctoringSession.session_id == session_id)
+                .values(risk_score=new_risk_score, timemodified=func.now())
+                .returning(ProctoringSession.status)
+            )
+            await db.commit()
             
-            if not session:
+            if status is None:
                 return
             
-            new_risk_score = await self.calculate_session_risk(db, session_id)
-            session.risk_score = new_risk_score
-            session.timemodified = datetime.utcnow()
-            db.commit()
+            if self.status_cache:
+                await self.status_cache.risk_updated(session_id, new_risk_score, active=status == "active")
             
-            logger.debug(f"Updated risk score to {new_risk_score} for session {session_id}")
+            logger.debug("Updated risk score to %s for session %s", new_risk_score, session_id)
             
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             logger.error(f"Failed to update risk score for session {session_id}: {str(e)}")
             raise
     
-    async def recalculate_session_risk(self, db: Session, session_id: str) -> float:
+    def schedule_session_risk_update(self, session_id: str):
+        """Update the stored risk score in the background without blocking the caller."""
+        if session_id in self._update_tasks:
+            # An update is already running; have it run once more to pick up new violations
+            self._update_requested.add(session_id)
+            return
+        
+        self._update_tasks[session_id] = asyncio.create_task(self._run_session_risk_updates(session_id))
+    
+    async def _run_session_risk_updates(self, session_id: str):
+        try:
+            async with SessionLocal() as db:
+                while True:
+                    self._update_requested.discard(session_id)
+                    try:
+                        await self.update_session_risk(db, session_id)
+                    except Exception:
+                        pass  # Already logged by update_session_risk
+                    
+                    if session_id not in self._update_requested:
+                        break
+        finally:
+            self._update_tasks.pop(session_id, None)
+    
+    async def recalculate_session_risk(self, db: AsyncSession, session_id: str) -> float:
         """Force recalculation of risk score."""
         await self.update_session_risk(db, session_id)
         return await self.calculate_session_risk(db, session_id)
     
-    async def get_risk_trend(self, db: Session, session_id: str, hours: int = 24) -> dict:
+    async def get_risk_trend(self, db: AsyncSession, session_id: str, hours: int = 24) -> dict:
         """Get risk trend over time for a session."""
         try:
-            session = db.query(ProctoringSession).filter(
-                ProctoringSession.session_id == session_id
-            ).first()
+            session = await self._get_session(db, session_id)
             
             if not session:
                 return {}
             
-            # Get violations in time windows
-            current_time = datetime.utcnow()
+            # Get violations in time windows (timecreated is timezone-aware)
+            current_time = datetime.now(timezone.utc)
             time_window = timedelta(hours=hours)
             start_time = current_time - time_window
             
-            violations = db.query(Violation).filter(
-                Violation.session_id == session.id,
-                Violation.timecreated >= start_time
-            ).order_by(Violation.timecreated).all()
-            
-            # Calculate risk at different time points
-            time_points = []
-            risk_scores = []
+            result = await db.execute(
+                select(Violation.type_id, Violation.confidence, extract("epoch", Violation.timecreated)).where(
+                    Violation.session_id == session.id,
+                    Violation.timecreated >= start_time
+                ).order_by(Violation.timecreated)
+            )
+            # (type_id, confidence, created epoch seconds) per violation
+            violations = np.array(result.all(), dtype=np.float64).reshape(-1, 3)
             
             # Sample every 15 minutes
             sample_interval = timedelta(minutes=15)
-            current_sample = start_time
+            sample_count = int(time_window / sample_interval) + 1
+            time_points = [(start_time + i * sample_interval).isoformat() for i in range(sample_count)]
             
-            while current_sample <= current_time:
-                # Calculate risk up to this point
-                relevant_violations = [
-                    v for v in violations 
-                    if v.timecreated <= current_sample
-                ]
-                
-                if relevant_violations:
-                    risk = self._calculate_risk_for_violations(relevant_violations, current_sample)
-                else:
-                    risk = 0.0
-                
-                time_points.append(current_sample.isoformat())
-                risk_scores.append(risk)
-                current_sample += sample_interval
+            # Risk at every sample point in one pass: rows are sample points, columns are violations
+            weights = self._weights_arr[violations[:, 0].astype(np.intp)] * violations[:, 1]
+            samples = start_time.timestamp() + np.arange(sample_count) * sample_interval.total_seconds()
+            
+            seconds_elapsed = samples[:, None] - violations[None, :, 2]
+            counted = seconds_elapsed >= 0  # only violations created up to the sample point
+            time_decay = np.clip(1.0 - DECAY_PER_SECOND * seconds_elapsed, 0.1, 1.0)
+            
+            total_risk = (weights * time_decay * counted).sum(axis=1)
+            violation_counts = counted.sum(axis=1)
+            frequency_multiplier = np.minimum(1.0 + violation_counts * 0.1, 2.0)
+            risk_scores = np.where(violation_counts > 0, np.minimum(total_risk * frequency_multiplier, 1.0), 0.0).tolist()
             
             return {
                 "time_points": time_points,
@@ -172,46 +220,51 @@ class RiskCalculator:
             logger.error(f"Failed to get risk trend for session {session_id}: {str(e)}")
             return {}
     
-    def _calculate_risk_for_violations(self, violations: list, assessment_time: datetime) -> float:
-        """Calculate risk for a specific set of violations at a specific time."""
-        total_risk = 0.0
-        
-        for violation in violations:
-            base_weight = self.violation_weights.get(violation.type, 0.5)
-            confidence_multiplier = violation.confidence
-            
-            # Calculate time decay from assessment time
-            time_diff = assessment_time - violation.timecreated
-            time_decay = self._calculate_time_decay(time_diff)
-            
-            violation_risk = base_weight * confidence_multiplier * time_decay
-            total_risk += violation_risk
-        
-        # Apply frequency penalty
-        frequency_multiplier = min(1.0 + (len(violations) * 0.1), 2.0)
-        total_risk *= frequency_multiplier
-        
-        return min(total_risk, 1.0)
-    
-    async def get_high_risk_sessions(self, db: Session, threshold: float = 0.7) -> list:
+    async def get_high_risk_sessions(self, db: AsyncSession, threshold: float = 0.7) -> list:
         """Get sessions with risk scores above threshold."""
         try:
-            sessions = db.query(ProctoringSession).filter(
-                ProctoringSession.risk_score >= threshold,
-                ProctoringSession.status == "active"
-            ).order_by(ProctoringSession.risk_score.desc()).all()
+            cached = await self.status_cache.high_risk_sessions(db, threshold) if self.status_cache else None
+            
+            if cached is None:
+                result = await db.execute(
+                    select(ProctoringSession).where(
+                        ProctoringSession.risk_score >= threshold,
+                        ProctoringSession.status == "active"
+                    ).order_by(ProctoringSession.risk_score.desc())
+                )
+                scored_sessions = [(s, s.risk_score) for s in result.scalars().all()]
+            elif not cached:
+                return []
+            else:
+                # Risk scores come from the Redis sorted set; only the listed sessions are loaded
+                result = await db.execute(
+                    select(ProctoringSession).where(
+                        ProctoringSession.session_id.in_([session_id for session_id, _ in cached]),
+                        ProctoringSession.status == "active"
+                    )
+                )
+                sessions = {s.session_id: s for s in result.scalars().all()}
+                # Sessions that ended without leaving the ranking are removed from it
+                await self.status_cache.prune_high_risk_sessions(
+                    [session_id for session_id, _ in cached if session_id not in sessions]
+                )
+                scored_sessions = [
+                    (sessions[session_id], risk_score)
+                    for session_id, risk_score in cached
+                    if session_id in sessions
+                ]
             
             return [
                 {
                     "session_id": s.session_id,
                     "user_id": s.user_id,
                     "quiz_id": s.quiz_id,
-                    "risk_score": s.risk_score,
+                    "risk_score": risk_score,
                     "violation_count": s.violation_count,
                     "time_started": s.timestarted.isoformat(),
                     "last_activity": s.timemodified.isoformat()
                 }
-                for s in sessions
+                for s, risk_score in scored_sessions
             ]
             
         except Exception as e:
@@ -1,19 +1,26 @@
-from sqlalchemy.orm import Session
-from models.models import ProctoringSession
+from sqlalchemy import and_, bindparam, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.models import ProctoringSession, Violation
 from schemas.schemas import SessionCreate
-import uuid
-from datetime import datetime
+from services.risk_calculator import violation_risk_expression, apply_frequency_penalty
+import uuid6
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Session lookup run on every processed frame, chunk and event; built once and executed with a bound id
+_SELECT_SESSION = select(ProctoringSession).where(ProctoringSession.session_id == bindparam("session_id"))
+
 class SessionManager:
     """Manages proctoring sessions."""
     
-    async def create_session(self, db: Session, session_data: SessionCreate) -> ProctoringSession:
+    async def create_session(self, db: AsyncSession, session_data: SessionCreate) -> ProctoringSession:
         """Create a new proctoring session."""
         try:
-            session_id = str(uuid.uuid4())
+            session_id = str(uuid6.uuid7())  # time-ordered, so inserts land on the right edge of the index
+            now = datetime.now(timezone.utc)
             
             db_session = ProctoringSession(
                 session_id=session_id,
@@ -23,71 +30,105 @@ class SessionManager:
                 status="active",
                 risk_score=0.0,
                 violation_count=0,
-                timestarted=datetime.utcnow(),
-                timecreated=datetime.utcnow(),
-                timemodified=datetime.utcnow()
+                timestarted=now,
+                timecreated=now,
+                timemodified=now
             )
             
+            # Every column is set here and the id comes back with the INSERT, so no refresh is needed
             db.add(db_session)
-            db.commit()
-            db.refresh(db_session)
+            await db.commit()
             
-            logger.info(f"Created session {session_id} for user {session_data.user_id}")
+            logger.info("Created session %s for user %s", session_id, session_data.user_id)
             return db_session
             
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             logger.error(f"Failed to create session: {str(e)}")
             raise
     
-    async def get_session(self, db: Session, session_id: str) -> ProctoringSession:
+    async def get_session(self, db: AsyncSession, session_id: str) -> ProctoringSession:
         """Get a session by ID."""
-        return db.query(ProctoringSession).filter(
-            ProctoringSession.session_id == session_id
-        ).first()
+        result = await db.execute(_SELECT_SESSION, {"session_id": session_id})
+        return result.scalars().first()
+    
+    async def get_session_with_risk(self, db: AsyncSession, session_id: str) -> Tuple[Optional[ProctoringSession], float]:
+        """Get a session and its current risk score with a single query."""
+        result = await db.execute(
+            select(
+                ProctoringSession,
+                func.coalesce(func.sum(violation_risk_expression()), 0.0),
+                func.count(Violation.id)
+            ).outerjoin(
+                Violation,
+                and_(Violation.session_id == ProctoringSession.id, Violation.resolved == False)
+            ).where(
+                ProctoringSession.session_id == session_id
+            ).group_by(ProctoringSession.id)
+        )
+        row = result.first()
+        
+        if not row:
+            return None, 0.0
+        
+        session, total_risk, violation_count = row
+        return session, apply_frequency_penalty(float(total_risk), violation_count)
+    
+    async def get_active_risk_scores(self, db: AsyncSession) -> List[Tuple[str, float]]:
+        """Get (session_id, stored risk score) for every active session."""
+        result = await db.execute(
+            select(ProctoringSession.session_id, ProctoringSession.risk_score).where(
+                ProctoringSession.status == "active"
+            )
+        )
+        return [(session_id, risk_score or 0.0) for session_id, risk_score in result.all()]
     
-    async def end_session(self, db: Session, session_id: str):
+    async def end_session(self, db: AsyncSession, session_id: str):
         """End a proctoring session."""
         try:
-            session = await self.get_session(db, session_id)
-            if session:
-                session.status = "ended"
-                session.timeended = datetime.utcnow()
-                session.timemodified = datetime.utcnow()
-                db.commit()
-                logger.info(f"Ended session {session_id}")
+            result = await db.execute(
+                update(ProctoringSession)
+                .where(ProctoringSession.session_id == session_id)
+                .values(status="ended", timeended=func.now(), timemodified=func.now())
+            )
+            await db.commit()
+            if result.rowcount:
+                logger.info("Ended session %s", session_id)
             else:
                 logger.warning(f"Session {session_id} not found")
                 
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             logger.error(f"Failed to end session {session_id}: {str(e)}")
             raise
     
-    async def update_session_risk(self, db: Session, session_id: str, risk_score: float):
+    async def update_session_risk(self, db: AsyncSession, session_id: str, risk_score: float):
         """Update session risk score."""
         try:
-            session = await self.get_session(db, session_id)
-            if session:
-                session.risk_score = risk_score
-                session.timemodified = datetime.utcnow()
-                db.commit()
+            await db.execute(
+                update(ProctoringSession)
+                .where(ProctoringSession.session_id == session_id)
+                .values(risk_score=risk_score, timemodified=func.now())
+            )
+            await db.commit()
                 
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             logger.error(f"Failed to update risk score for session {session_id}: {str(e)}")
             raise
     
-    async def increment_violation_count(self, db: Session, session_id: str):
+    async def increment_violation_count(self, db: AsyncSession, session_id: str):
         """Increment violation count for a session."""
         try:
-            session = await self.get_session(db, session_id)
-            if session:
-                session.violation_count += 1
-                session.timemodified = datetime.utcnow()
-                db.commit()
+            # Incremented in SQL so concurrent violations cannot overwrite each other's count
+            await db.execute(
+                update(ProctoringSession)
+                .where(ProctoringSession.session_id == session_id)
+                .values(violation_count=ProctoringSession.violation_count + 1, timemodified=func.now())
+            )
+            await db.commit()
                 
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             logger.error(f"Failed to increment violation count for session {session_id}: {str(e)}")
             raise
\ No newline at end of file
@@ -0,0 +1,224 @@
+from redis.exceptions import WatchError
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.models import ProctoringSession
+from schemas.schemas import SessionStatus
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Hash fields that must all be present for a cached session state to be served
+_STATE_FIELDS = ("status", "violation_count", "time_started", "last_activity")
+
+# Sorted set of active sessions scored by their latest risk score, and the marker set once it has been
+# built from every active session in Postgres (both are lost together when Redis restarts)
+_HIGH_RISK_KEY = "proct:risk:active"
+_HIGH_RISK_READY_KEY = "proct:risk:active:ready"
+
+class SessionStatusCache:
+    """Keeps live session state in Redis so status reads do not hit Postgres."""
+
+    def __init__(self, redis_client, session_manager, risk_ttl: int = 60, state_ttl: int = 4 * 3600):
+        self.redis = redis_client
+        self.session_manager = session_manager
+        self.risk_ttl = risk_ttl
+        self.state_ttl = state_ttl
+
+    def _state_key(self, session_id: str) -> str:
+        return f"proct:{session_id}"
+
+    def _risk_key(self, session_id: str) -> str:
+        return f"proct:{session_id}:risk"
+
+    async def get_status(self, db: AsyncSession, session_id: str) -> Optional[SessionStatus]:
+        """Get session status from Redis, falling back to the database on a miss."""
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hgetall(self._state_key(session_id))
+            pipe.get(self._risk_key(session_id))
+            state, risk_score = await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to read cached state for session {session_id}: {str(e)}")
+            state, risk_score = {}, None
+
+        if risk_score is not None and all(field in state for field in _STATE_FIELDS):
+            return SessionStatus(
+                session_id=session_id,
+                status=state["status"],
+                risk_score=float(risk_score),
+                violation_count=int(state["violation_count"]),
+                time_started=state["time_started"],
+                last_activity=state["last_activity"]
+            )
+
+        return await self._load(db, session_id)
+
+    async def session_started(self, session: ProctoringSession):
+        """Seed the cached state for a new session."""
+        await self._write(SessionStatus(
+            session_id=session.session_id,
+            status=session.status,
+            risk_score=session.risk_score,
+            violation_count=session.violation_count,
+            time_started=session.timestarted,
+            last_activity=session.timemodified
+        ))
+
+    async def violations_recorded(self, session_id: str, count: int):
+        """Bump the cached violation count after violations were stored."""
+        if not count:
+            return
+
+        state_key = self._state_key(session_id)
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hincrby(state_key, "violation_count", count)
+            pipe.hset(state_key, "last_activity", datetime.now(timezone.utc).isoformat())
+            # An expired hash comes back holding only these fields; it is never served (the next read
+            # reloads it) but still needs a TTL
+            pipe.expire(state_key, self.state_ttl)
+            # The cached risk no longer reflects these violations; the next read recalculates it
+            pipe.delete(self._risk_key(session_id))
+            await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to update cached violation count for session {session_id}: {str(e)}")
+
+    async def risk_updated(self, session_id: str, risk_score: float, active: bool = True):
+        """Cache a freshly calculated risk score; only active sessions are ranked."""
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.set(self._risk_key(session_id), risk_score, ex=self.risk_ttl)
+            if active:
+                pipe.zadd(_HIGH_RISK_KEY, {session_id: risk_score})
+            else:
+                # A late update for an ended session must not put it back in the ranking
+                pipe.zrem(_HIGH_RISK_KEY, session_id)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to cache risk score for session {session_id}: {str(e)}")
+
+    async def session_ended(self, session_id: str):
+        """Mark the cached session as ended."""
+        state_key = self._state_key(session_id)
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hset(state_key, mapping={
+                "status": "ended",
+                "last_activity": datetime.now(timezone.utc).isoformat()
+            })
+            # As in violations_recorded, an expired hash must not come back as a partial key without a TTL
+            pipe.expire(state_key, self.state_ttl)
+            pipe.zrem(_HIGH_RISK_KEY, session_id)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to update cached state for session {session_id}: {str(e)}")
+
+    async def high_risk_sessions(self, db: AsyncSession, threshold: float) -> Optional[List[Tuple[str, float]]]:
+        """Get (session_id, risk_score) for active sessions at or above threshold, highest first.
+
+        The ranking is rebuilt from the database when it has not been built yet (first use, or after a
+        Redis restart). Returns None if Redis cannot be read, so callers can fall back to the database.
+        """
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.exists(_HIGH_RISK_READY_KEY)
+            pipe.zrevrangebyscore(_HIGH_RISK_KEY, "+inf", threshold, withscores=True)
+            ready, entries = await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to read high risk sessions: {str(e)}")
+            return None
+
+        if not ready:
+            return await self._rebuild_high_risk(db, threshold)
+
+        return [(session_id, float(risk_score)) for session_id, risk_score in entries]
+
+    async def prune_high_risk_sessions(self, session_ids: List[str]):
+        """Drop sessions that are no longer active from the ranking."""
+        if not session_ids:
+            return
+
+        try:
+            await self.redis.zrem(_HIGH_RISK_KEY, *session_ids)
+        except Exception as e:
+            logger.warning(f"Failed to prune {len(session_ids)} high risk sessions: {str(e)}")
+
+    async def _rebuild_high_risk(self, db: AsyncSession, threshold: float) -> Optional[List[Tuple[str, float]]]:
+        """Rank every active session by its stored risk score and return those at or above threshold."""
+        scores = await self.session_manager.get_active_risk_scores(db)
+        try:
+            pipe = self.redis.pipeline(transaction=True)
+            if scores:
+                pipe.zadd(_HIGH_RISK_KEY, dict(scores))
+            pipe.set(_HIGH_RISK_READY_KEY, 1)
+            await pipe.execute()
+            logger.info(f"Rebuilt high risk ranking from {len(scores)} active sessions")
+        except Exception as e:
+            logger.warning(f"Failed to rebuild high risk sessions: {str(e)}")
+            return None
+
+        return sorted(
+            ((session_id, risk_score) for session_id, risk_score in scores if risk_score >= threshold),
+            key=lambda entry: entry[1],
+            reverse=True
+        )
+
+    async def _load(self, db: AsyncSession, session_id: str) -> Optional[SessionStatus]:
+        """Load session status from the database and cache it."""
+        state_key = self._state_key(session_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            # Watch the hash before reading Postgres: an increment from a flush that lands between the read
+            # and the write aborts the write instead of being overwritten by the older count
+            try:
+                await pipe.watch(state_key)
+                watching = True
+            except Exception as e:
+                logger.warning(f"Failed to watch cached state for session {session_id}: {str(e)}")
+                watching = False
+
+            session, risk_score = await self.session_manager.get_session_with_risk(db, session_id)
+            if not session:
+                return None
+
+            status = SessionStatus(
+                session_id=session_id,
+                status=session.status,
+                risk_score=risk_score,
+                violation_count=session.violation_count,
+                time_started=session.timestarted,
+                last_activity=session.timemodified
+            )
+            if watching:
+                try:
+                    pipe.multi()
+                    self._queue_write(pipe, status)
+                    await pipe.execute()
+                except WatchError:
+                    # The next read reloads the state, now including the concurrent increment
+                    logger.debug(f"Cached state for session {session_id} changed while loading; not caching")
+                except Exception as e:
+                    logger.warning(f"Failed to cache state for session {session_id}: {str(e)}")
+        return status
+
+    async def _write(self, status: SessionStatus):
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            self._queue_write(pipe, status)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to cache state for session {status.session_id}: {str(e)}")
+
+    def _queue_write(self, pipe, status: SessionStatus):
+        """Queue the commands that cache a full session state on a pipeline."""
+        state_key = self._state_key(status.session_id)
+        pipe.hset(state_key, mapping={
+            "status": status.status,
+            "violation_count": status.violation_count,
+            "time_started": status.time_started.isoformat(),
+            "last_activity": status.last_activity.isoformat()
+        })
+        pipe.expire(state_key, self.state_ttl)
+        pipe.set(self._risk_key(status.session_id), status.risk_score, ex=self.risk_ttl)
+        if status.status == "active":
+            pipe.zadd(_HIGH_RISK_KEY, {status.session_id: status.risk_score})
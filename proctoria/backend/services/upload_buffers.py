@@ -0,0 +1,91 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List
+import logging
+
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload does not fit in a pooled buffer."""
+
+class UploadBufferPool:
+    """Reads uploads into reusable buffers instead of allocating a new bytes object per request.
+
+    Buffers come in power-of-two size classes from min_buffer_size up to max_file_size, so a buffer
+    is only as large as the upload needs; at most max_pooled_bytes of them are kept for reuse.
+    """
+
+    def __init__(self, max_file_size: int, max_pooled_bytes: int = 16 * 1024 * 1024,
+                 min_buffer_size: int = 64 * 1024):
+        self.max_file_size = max_file_size
+        self.max_pooled_bytes = max_pooled_bytes
+        self.min_buffer_size = min_buffer_size
+        self._free: Dict[int, List[bytearray]] = {}
+        self._pooled_bytes = 0
+
+    @asynccontextmanager
+    async def read(self, upload: UploadFile) -> AsyncIterator[memoryview]:
+        """Read an upload into a pooled buffer; the view is only valid inside the block."""
+        if upload.size is not None and upload.size > self.max_file_size:
+            raise UploadTooLargeError(f"Upload exceeds {self.max_file_size} bytes")
+
+        buffer = self._take(self._size_class(upload.size))
+        try:
+            view = await self._read_into(upload, memoryview(buffer))
+        except Exception:
+            self._release(buffer)
+            raise
+
+        # A cancelled request may still have its frame queued, so its buffer is left to be garbage collected;
+        # any other exit (including errors raised inside the block) means nothing else holds the view
+        try:
+            yield view
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._release(buffer)
+            raise
+        else:
+            self._release(buffer)
+
+    def _size_class(self, size) -> int:
+        """Smallest buffer size that holds an upload of the given size (the largest when it is unknown)."""
+        if size is None:
+            return self.max_file_size
+        buffer_size = self.min_buffer_size
+        while buffer_size < size:
+            buffer_size *= 2
+        return min(buffer_size, self.max_file_size)
+
+    def _take(self, buffer_size: int) -> bytearray:
+        free = self._free.get(buffer_size)
+        if free:
+            self._pooled_bytes -= buffer_size
+            return free.pop()
+        return bytearray(buffer_size)
+
+    def _release(self, buffer: bytearray):
+        if self._pooled_bytes + len(buffer) <= self.max_pooled_bytes:
+            self._free.setdefault(len(buffer), []).append(buffer)
+            self._pooled_bytes += len(buffer)
+
+    async def _read_into(self, upload: UploadFile, view: memoryview) -> memoryview:
+        # One threadpool call fills the buffer, whether the upload is held in memory or spooled to disk
+        total = await run_in_threadpool(self._readinto_all, upload, view)
+        if total == len(view) and await run_in_threadpool(upload.file.read, 1):
+            # Buffer is full and another byte follows; the upload is larger than reported
+            raise UploadTooLargeError(f"Upload exceeds {len(view)} bytes")
+        return view[:total]
+
+    @staticmethod
+    def _readinto_all(upload: UploadFile, view: memoryview) -> int:
+        total = 0
+        while total < len(view):
+            read = upload.file.readinto(view[total:])
+            if not read:
+                break
+            total += read
+        return total
@@ -0,0 +1,118 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from database import SessionLocal
+from schemas.schemas import ViolationCreate
+
+logger = logging.getLogger(__name__)
+
+class ViolationWriteBuffer:
+    """Buffers violations from high-frequency endpoints and writes them with COPY on a short timer.
+
+    Sessions that had violations written get their cached state bumped and a background
+    risk recalculation scheduled once the write has committed. A failed write is re-queued;
+    sessions whose violations fail max_attempts writes in a row have those violations dropped.
+    """
+
+    def __init__(self, violation_processor, status_cache=None, risk_calculator=None,
+                 flush_interval_ms: int = 50, max_pending: int = 128, max_attempts: int = 3):
+        self.violation_processor = violation_processor
+        self.status_cache = status_cache
+        self.risk_calculator = risk_calculator
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self._pending: Dict[str, List[ViolationCreate]] = {}
+        self._pending_count = 0
+        # Failed writes so far for sessions whose violations were re-queued
+        self._failed_attempts: Dict[str, int] = {}
+        self._worker: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Start the background flush task."""
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+            logger.info(f"Violation write buffer started (flush every {self.flush_interval * 1000:.0f}ms)")
+
+    async def stop(self):
+        """Stop the background flush task and write anything still buffered."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        # Re-queued violations get their remaining attempts before shutdown
+        for _ in range(self.max_attempts):
+            if not self._pending:
+                break
+            await self.flush()
+
+    async def add(self, session_id: str, violations: List[ViolationCreate]):
+        """Queue violations for a session; they are written on the next flush."""
+        if not violations:
+            return
+
+        self._pending.setdefault(session_id, []).extend(violations)
+        self._pending_count += len(violations)
+        if self._worker is None or self._pending_count >= self.max_pending:
+            await self.flush()
+
+    async def flush(self):
+        """Write all buffered violations in one COPY, retried sessions each in their own."""
+        if not self._pending:
+            return
+
+        pending, self._pending = self._pending, {}
+        self._pending_count = 0
+
+        # Sessions that already failed are written on their own, so one bad row only holds back its session
+        fresh = {session_id: violations for session_id, violations in pending.items()
+                 if session_id not in self._failed_attempts}
+        batches = [fresh] if fresh else []
+        batches.extend({session_id: violations} for session_id, violations in pending.items()
+                       if session_id in self._failed_attempts)
+
+        for batch in batches:
+            await self._write(batch)
+
+    async def _write(self, batch: Dict[str, List[ViolationCreate]]):
+        """Write one batch, re-queueing it if the write fails."""
+        try:
+            async with SessionLocal() as db:
+                counts = await self.violation_processor.copy_violations(db, batch)
+        except Exception as e:
+            logger.error(f"Failed to flush {sum(map(len, batch.values()))} buffered violations: {str(e)}")
+            self._requeue(batch)
+            return
+
+        for session_id, count in counts.items():
+            if self.status_cache is not None:
+                await self.status_cache.violations_recorded(session_id, count)
+            if self.risk_calculator is not None and count:
+                self.risk_calculator.schedule_session_risk_update(session_id)
+        for session_id in batch:
+            self._failed_attempts.pop(session_id, None)
+
+    def _requeue(self, batch: Dict[str, List[ViolationCreate]]):
+        """Put a failed batch back ahead of newer violations, dropping sessions out of attempts."""
+        for session_id, violations in batch.items():
+            attempts = self._failed_attempts.get(session_id, 0) + 1
+            if attempts >= self.max_attempts:
+                logger.error(
+                    f"Dropping {len(violations)} violations for session {session_id} after {attempts} failed writes"
+                )
+                self._failed_attempts.pop(session_id, None)
+                continue
+
+            self._failed_attempts[session_id] = attempts
+            self._pending[session_id] = violations + self._pending.get(session_id, [])
+            self._pending_count += len(violations)
+
+    async def _run(self):
+        """Flush the buffer on a fixed interval."""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
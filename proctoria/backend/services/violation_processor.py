@@ -1,134 +1,262 @@
-from sqlalchemy.orm import Session
-from models.models import Violation, ProctoringSession
-from schemas.schemas import ViolationCreate, ViolationResponse
-from datetime import datetime
+from sqlalchemy import bindparam, func, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from models.models import Violation, ViolationSummary, ProctoringSession, violation_type_id
+from schemas.schemas import ViolationCreate, ViolationResponse, ViolationResponseList
+from datetime import datetime, timezone
+from collections import Counter
+from typing import Dict, List, Tuple
+import orjson
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Column order of the records written by copy_violations
+_COPY_COLUMNS = ["session_id", "type", "type_id", "confidence", "details", "screenshot_url", "resolved", "timecreated"]
+
+# Violation columns returned by get_session_violations, matching ViolationResponse
+_RESPONSE_COLUMNS = [getattr(Violation, field) for field in ViolationResponse.model_fields]
+
+# Statements on the per-violation path, built once and executed with bound parameters
+_COUNT_VIOLATION = (
+    update(ProctoringSession)
+    .where(ProctoringSession.session_id == bindparam("external_id"))
+    .values(violation_count=ProctoringSession.violation_count + 1, timemodified=func.now())
+    .returning(ProctoringSession.id)
+)
+_INSERT_VIOLATION = insert(Violation).returning(Violation)
+
 class ViolationProcessor:
     """Processes and manages violations."""
     
-    async def process_violation(self, db: Session, session_id: str, violation_data: ViolationCreate) -> Violation:
+    async def _add_to_summary(self, db: AsyncSession, counts: Dict[Tuple[int, str], int]):
+        """Add stored violation counts, keyed by (internal session id, type), to the summary rollup."""
+        if not counts:
+            return
+        
+        # Rows are upserted in key order so concurrent writers lock them in the same order
+        stmt = pg_insert(ViolationSummary).values([
+            {"session_id": session_id, "type": violation_type, "count": count}
+            for (session_id, violation_type), count in sorted(counts.items())
+        ])
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[ViolationSummary.session_id, ViolationSummary.type],
+            set_={"count": ViolationSummary.count + stmt.excluded.count}
+        ))
+    
+    async def backfill_violation_summaries(self, conn: AsyncConnection):
+        """Build the summary rollup from the violations already stored (run once, when its table is created)."""
+        result = await conn.execute(
+            insert(ViolationSummary).from_select(
+                ["session_id", "type", "count", "resolved_count"],
+                select(
+                    Violation.session_id,
+                    Violation.type,
+                    func.count(),
+                    func.count().filter(Violation.resolved)
+                ).group_by(Violation.session_id, Violation.type)
+            )
+        )
+        logger.info("Backfilled %d violation summary rows", result.rowcount)
+    
+    async def process_violation(self, db: AsyncSession, session_id: str, violation_data: ViolationCreate) -> Violation:
         """Process and store a violation."""
         try:
-            # Get session
-            session = db.query(ProctoringSession).filter(
-                ProctoringSession.session_id == session_id
-            ).first()
+            # Count the violation against the session, getting its internal id back in the same statement
+            internal_id = await db.scalar(_COUNT_VIOLATION, {"external_id": session_id})
             
-            if not session:
+            if internal_id is None:
                 raise Exception(f"Session {session_id} not found")
             
-            # Create violation record
-            db_violation = Violation(
-                session_id=session.id,
-                type=violation_data.type,
-                confidence=violation_data.confidence,
-                details=violation_data.details,
-                screenshot_url=violation_data.screenshot_url,
-                resolved=False,
-                timecreated=datetime.utcnow()
+            # Create violation record (its id and timestamp come back with the INSERT)
+            db_violation = await db.scalar(_INSERT_VIOLATION, {
+                "session_id": internal_id,
+                "type": violation_data.type,
+                "confidence": violation_data.confidence,
+                "details": violation_data.details,
+                "screenshot_url": violation_data.screenshot_url,
+                "resolved": False
+            })
+            await self._add_to_summary(db, {(internal_id, violation_data.type): 1})
+            
+            await db.commit()
+            
+            logger.info("Processed violation %s for session %s", violation_data.type, session_id)
+            return db_violation
+            
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Failed to process violation for session {session_id}: {str(e)}")
+            raise
+    
+    async def copy_violations(self, db: AsyncSession, violations_by_session: Dict[str, List[ViolationCreate]]) -> Dict[str, int]:
+        """Store violations for several sessions with a single COPY; returns the number stored per session."""
+        if not violations_by_session:
+            return {}
+        
+        try:
+            result = await db.execute(
+                select(ProctoringSession.id, ProctoringSession.session_id).where(
+                    ProctoringSession.session_id.in_(violations_by_session.keys())
+                )
             )
+            session_ids = {session_id: id for id, session_id in result.all()}
             
-            db.add(db_violation)
+            known_sessions = []
+            for session_id, violations in violations_by_session.items():
+                if session_id in session_ids:
+                    known_sessions.append(session_id)
+                else:
+                    logger.warning(f"Dropping {len(violations)} violations for unknown session {session_id}")
             
-            # Update session violation count
-            session.violation_count += 1
-            session.timemodified = datetime.utcnow()
+            # Sessions are written in internal id order so that concurrent flushes from other workers
+            # take the session and summary row locks in the same order instead of deadlocking
+            known_sessions.sort(key=session_ids.get)
+            now = datetime.now(timezone.utc)
+            records = []
+            counts = {}
+            for session_id in known_sessions:
+                violations = violations_by_session[session_id]
+                for violation_data in violations:
+                    records.append((
+                        session_ids[session_id],
+                        violation_data.type,
+                        violation_type_id(violation_data.type),
+                        violation_data.confidence,
+                        orjson.dumps(violation_data.details).decode() if violation_data.details is not None else None,
+                        violation_data.screenshot_url,
+                        False,
+                        now
+                    ))
+                counts[session_id] = len(violations)
             
-            db.commit()
-            db.refresh(db_violation)
+            if not records:
+                return {}
             
-            logger.info(f"Processed violation {violation_data.type} for session {session_id}")
-            return db_violation
+            # COPY runs on the driver connection, inside the transaction opened by the query above
+            connection = await (await db.connection()).get_raw_connection()
+            await connection.driver_connection.copy_records_to_table(
+                Violation.__tablename__, records=records, columns=_COPY_COLUMNS
+            )
+            
+            await self._add_to_summary(db, Counter((record[0], record[1]) for record in records))
+            
+            # Update session violation counts with one executemany over the sessions table, in the same
+            # internal id order as the records
+            sessions_table = ProctoringSession.__table__
+            await (await db.connection()).execute(
+                update(sessions_table)
+                .where(sessions_table.c.id == bindparam("internal_id"))
+                .values(violation_count=sessions_table.c.violation_count + bindparam("added"), timemodified=now),
+                [{"internal_id": session_ids[session_id], "added": count} for session_id, count in counts.items()]
+            )
+            
+            await db.commit()
+            
+            logger.info("Copied %d violations for %d sessions", len(records), len(counts))
+            return counts
             
         except Exception as e:
-            db.rollback()
-            logger.error(f"Failed to process violation for session {session_id}: {str(e)}")
+            await db.rollback()
+            logger.error(f"Failed to copy violations: {str(e)}")
             raise
     
-    async def create_violation(self, db: Session, session_id: str, violation_data: ViolationCreate) -> Violation:
+    async def create_violation(self, db: AsyncSession, session_id: str, violation_data: ViolationCreate) -> Violation:
         """Manually create a violation."""
         return await self.process_violation(db, session_id, violation_data)
     
-    async def get_session_violations(self, db: Session, session_id: str) -> list[ViolationResponse]:
+    async def get_session_violations(self, db: AsyncSession, session_id: str) -> list[ViolationResponse]:
         """Get all violations for a session."""
         try:
-            session = db.query(ProctoringSession).filter(
-                ProctoringSession.session_id == session_id
-            ).first()
-            
-            if not session:
-                return []
-            
-            violations = db.query(Violation).filter(
-                Violation.session_id == session.id
-            ).order_by(Violation.timecreated.desc()).all()
-            
-            return [
-                ViolationResponse(
-                    id=v.id,
-                    type=v.type,
-                    confidence=v.confidence,
-                    details=v.details,
-                    screenshot_url=v.screenshot_url,
-                    resolved=v.resolved,
-                    timecreated=v.timecreated
-                )
-                for v in violations
-            ]
+            # One query on the external session id, selecting only the response columns as plain rows
+            result = await db.execute(
+                select(*_RESPONSE_COLUMNS)
+                .join(ProctoringSession, Violation.session_id == ProctoringSession.id)
+                .where(ProctoringSession.session_id == session_id)
+                .order_by(Violation.timecreated.desc())
+            )
+            
+            return ViolationResponseList.validate_python(result.all())
             
         except Exception as e:
             logger.error(f"Failed to get violations for session {session_id}: {str(e)}")
             return []
     
-    async def update_violation_status(self, db: Session, violation_id: int, resolved: bool):
+    async def update_violation_status(self, db: AsyncSession, violation_id: int, resolved: bool):
         """Update violation resolution status."""
         try:
-            violation = db.query(Violation).filter(Violation.id == violation_id).first()
-            if violation:
-                violation.resolved = resolved
-                db.commit()
-                logger.info(f"Updated violation {violation_id} status to {'resolved' if resolved else 'unresolved'}")
-            else:
+            # Only a status that actually changes moves the summary's resolved count
+            result = await db.execute(
+                update(Violation)
+                .where(Violation.id == violation_id, Violation.resolved.is_distinct_from(resolved))
+                .values(resolved=resolved)
+                .returning(Violation.session_id, Violation.type)
+            )
+            changed = result.first()
+            
+            if changed:
+                await db.execute(
+                    update(ViolationSummary)
+                    .where(ViolationSummary.session_id == changed.session_id, ViolationSummary.type == changed.type)
+                    .values(resolved_count=ViolationSummary.resolved_count + (1 if resolved else -1))
+                )
+                await db.commit()
+                logger.info("Updated violation %s status to %s", violation_id, "resolved" if resolved else "unresolved")
+            elif await db.get(Violation, violation_id) is None:
                 logger.warning(f"Violation {violation_id} not found")
                 
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             logger.error(f"Failed to update violation {violation_id}: {str(e)}")
             raise
     
-    async def get_violation_summary(self, db: Session, session_id: str) -> dict:
+    async def get_violation_summary(self, db: AsyncSession, session_id: str) -> dict:
         """Get violation summary for a session."""
+        summaries = await self.get_violation_summaries(db, [session_id])
+        return summaries.get(session_id, {})
+    
+    async def get_violation_summaries(self, db: AsyncSession, session_ids: List[str]) -> Dict[str, dict]:
+        """Get violation summaries for several sessions with a single query; unknown sessions are left out."""
+        if not session_ids:
+            return {}
+        
         try:
-            session = db.query(ProctoringSession).filter(
-                ProctoringSession.session_id == session_id
-            ).first()
-            
-            if not session:
-                return {}
-            
-            violations = db.query(Violation).filter(
-                Violation.session_id == session.id
-            ).all()
-            
-            # Count violations by type
-            violation_counts = {}
-            total_violations = len(violations)
-            resolved_violations = sum(1 for v in violations if v.resolved)
+            # Read the per-type rollups; the outer join yields a single (session, None, None, None) row
+            # for a session without violations and no rows for an unknown one
+            result = await db.execute(
+                select(
+                    ProctoringSession.session_id,
+                    ViolationSummary.type,
+                    ViolationSummary.count,
+                    ViolationSummary.resolved_count
+                )
+                .select_from(ProctoringSession)
+                .outerjoin(ViolationSummary, ViolationSummary.session_id == ProctoringSession.id)
+                .where(ProctoringSession.session_id.in_(session_ids))
+            )
             
-            for violation in violations:
-                violation_counts[violation.type] = violation_counts.get(violation.type, 0) + 1
+            counts_by_session: Dict[str, Dict[str, int]] = {}
+            resolved_by_session: Dict[str, int] = {}
+            for session_id, violation_type, count, resolved_count in result.all():
+                violation_counts = counts_by_session.setdefault(session_id, {})
+                resolved_by_session.setdefault(session_id, 0)
+                if count:
+                    violation_counts[violation_type] = count
+                    resolved_by_session[session_id] += resolved_count
             
-            return {
-                "total_violations": total_violations,
-                "resolved_violations": resolved_violations,
-                "unresolved_violations": total_violations - resolved_violations,
-                "violation_types": violation_counts,
-                "most_common_violation": max(violation_counts.keys(), key=violation_counts.get) if violation_counts else None
-            }
+            summaries = {}
+            for session_id, violation_counts in counts_by_session.items():
+                total_violations = sum(violation_counts.values())
+                resolved_violations = resolved_by_session[session_id]
+                summaries[session_id] = {
+                    "total_violations": total_violations,
+                    "resolved_violations": resolved_violations,
+                    "unresolved_violations": total_violations - resolved_violations,
+                    "violation_types": violation_counts,
+                    "most_common_violation": max(violation_counts.keys(), key=violation_counts.get) if violation_counts else None
+                }
+            return summaries
             
         except Exception as e:
-            logger.error(f"Failed to get violation summary for session {session_id}: {str(e)}")
+            logger.error(f"Failed to get violation summaries for {len(session_ids)} sessions: {str(e)}")
             return {}
\ No newline at end of file
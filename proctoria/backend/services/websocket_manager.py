@@ -1,19 +1,36 @@
 from fastapi import WebSocket
-import json
+from datetime import datetime
+import orjson
 import logging
-from typing import Dict, Set
+from typing import Dict, Optional, Tuple
 import asyncio
 
 logger = logging.getLogger(__name__)
 
+# Redis channels carrying monitoring room broadcasts between workers
+_ROOM_CHANNEL_PREFIX = "proct:room:"
+
 class WebSocketManager:
-    """Manages WebSocket connections for real-time communication."""
+    """Manages WebSocket connections for real-time communication.
+
+    With a Redis client, monitoring room broadcasts are published to Redis and every worker's
+    subscriber delivers them to its own connections, so dashboards see events from all workers.
+    """
     
-    def __init__(self):
+    def __init__(self, redis_client=None, heartbeat_interval: float = 30, heartbeat_timeout: float = 5):
+        self.redis = redis_client
+        self._subscriber: Optional[asyncio.Task] = None
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
         # Store active connections by session_id
         self.active_connections: Dict[str, WebSocket] = {}
-        # Store connections by room (for monitoring dashboard)
-        self.monitoring_rooms: Dict[str, Set[WebSocket]] = {}
+        # Loop time of the last successful send per session; recent traffic stands in for a heartbeat
+        self._last_sent: Dict[str, float] = {}
+        # Store connections by room (for monitoring dashboard); each room is an immutable tuple that is
+        # replaced on join/leave, so broadcasts iterate it without copying while it changes under them
+        self.monitoring_rooms: Dict[str, Tuple[WebSocket, ...]] = {}
+        # Last formatted timestamp and the loop-clock millisecond it was made in
+        self._timestamp_cache = (None, "")
     
     async def connect(self, websocket: WebSocket, session_id: str):
         """Accept a new WebSocket connection."""
@@ -32,46 +49,124 @@ class WebSocketManager:
         """Remove a WebSocket connection."""
         if session_id in self.active_connections:
             del self.active_connections[session_id]
+            self._last_sent.pop(session_id, None)
             logger.info(f"WebSocket disconnected for session {session_id}")
     
+    def _encode(self, message: dict) -> str:
+        """Serialize a message for a text frame."""
+        return orjson.dumps(message).decode()
+    
     async def send_personal_message(self, session_id: str, message: dict):
         """Send a message to a specific session."""
-        if session_id in self.active_connections:
-            try:
-                websocket = self.active_connections[session_id]
-                await websocket.send_text(json.dumps(message))
-            except Exception as e:
-                logger.error(f"Failed to send message to session {session_id}: {str(e)}")
-                # Remove dead connection
+        websocket = self.active_connections.get(session_id)
+        if websocket is not None:
+            await self._send_to(session_id, websocket, self._encode(message))
+    
+    async def _send_text(self, session_id: str, payload: str):
+        """Send an already serialized message to a specific session."""
+        websocket = self.active_connections.get(session_id)
+        if websocket is not None:
+            await self._send_to(session_id, websocket, payload)
+    
+    async def _send_to(self, session_id: str, websocket: WebSocket, payload: str):
+        """Send a payload on a session's connection, dropping the connection if the send fails."""
+        try:
+            await websocket.send_text(payload)
+            self._last_sent[session_id] = asyncio.get_running_loop().time()
+        except Exception as e:
+            logger.error(f"Failed to send message to session {session_id}: {str(e)}")
+            # Remove dead connection (unless the session has already reconnected)
+            if self.active_connections.get(session_id) is websocket:
                 self.disconnect(session_id)
     
     async def broadcast_to_monitoring(self, room: str, message: dict):
         """Broadcast message to all monitoring dashboard connections."""
-        if room in self.monitoring_rooms:
+        # Other workers may have connections in the room even when this one has none
+        if self._subscriber is not None or room in self.monitoring_rooms:
+            await self._broadcast_text(room, self._encode(message))
+    
+    async def _broadcast_text(self, room: str, payload: str):
+        """Send an already serialized message to a room on every worker."""
+        if self._subscriber is not None:
+            try:
+                await self.redis.publish(_ROOM_CHANNEL_PREFIX + room, payload)
+                return
+            except Exception as e:
+                logger.warning(f"Failed to publish broadcast to room {room}, sending locally: {str(e)}")
+        
+        await self._local_broadcast(room, payload)
+    
+    async def _local_broadcast(self, room: str, payload: str):
+        """Send an already serialized message to this worker's connections in a room, concurrently."""
+        connections = self.monitoring_rooms.get(room)
+        if connections:
+            results = await asyncio.gather(
+                *(websocket.send_text(payload) for websocket in connections), return_exceptions=True
+            )
+            
+            # Remove dead connections
             dead_connections = []
-            for websocket in self.monitoring_rooms[room]:
-                try:
-                    await websocket.send_text(json.dumps(message))
-                except Exception as e:
-                    logger.error(f"Failed to send broadcast message: {str(e)}")
+            for websocket, result in zip(connections, results):
+                if isinstance(result, Exception):
+                    logger.error(f"Failed to send broadcast message: {str(result)}")
                     dead_connections.append(websocket)
             
-            # Remove dead connections
-            for dead_ws in dead_connections:
-                self.monitoring_rooms[room].discard(dead_ws)
+            if dead_connections:
+                self._remove_from_room(room, dead_connections)
+    
+    async def start_room_subscriber(self):
+        """Start relaying room broadcasts published by any worker to local connections."""
+        if self.redis is not None and self._subscriber is None:
+            self._subscriber = asyncio.create_task(self._relay_room_broadcasts())
+            logger.info("Monitoring room subscriber started")
+    
+    async def stop_room_subscriber(self):
+        """Stop the room broadcast subscriber; broadcasts are then sent locally only."""
+        if self._subscriber is not None:
+            self._subscriber.cancel()
+            try:
+                await self._subscriber
+            except asyncio.CancelledError:
+                pass
+            self._subscriber = None
+    
+    async def _relay_room_broadcasts(self):
+        """Deliver published room broadcasts to local connections, resubscribing after Redis errors."""
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.psubscribe(_ROOM_CHANNEL_PREFIX + "*")
+                async for message in pubsub.listen():
+                    room = message["channel"][len(_ROOM_CHANNEL_PREFIX):]
+                    if room in self.monitoring_rooms:
+                        await self._local_broadcast(room, message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Monitoring room subscriber failed, retrying: {str(e)}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.reset()
     
     async def join_monitoring_room(self, websocket: WebSocket, room: str):
         """Add a WebSocket to a monitoring room."""
-        if room not in self.monitoring_rooms:
-            self.monitoring_rooms[room] = set()
-        self.monitoring_rooms[room].add(websocket)
+        connections = self.monitoring_rooms.get(room, ())
+        if websocket not in connections:
+            self.monitoring_rooms[room] = connections + (websocket,)
         logger.info(f"WebSocket joined monitoring room {room}")
     
     async def leave_monitoring_room(self, websocket: WebSocket, room: str):
         """Remove a WebSocket from a monitoring room."""
+        self._remove_from_room(room, [websocket])
+    
+    def _remove_from_room(self, room: str, websockets: list):
+        """Rebuild a room without the given connections, dropping it once empty."""
         if room in self.monitoring_rooms:
-            self.monitoring_rooms[room].discard(websocket)
-            if not self.monitoring_rooms[room]:
+            gone = {id(websocket) for websocket in websockets}
+            connections = tuple(ws for ws in self.monitoring_rooms[room] if id(ws) not in gone)
+            if connections:
+                self.monitoring_rooms[room] = connections
+            else:
                 del self.monitoring_rooms[room]
     
     async def handle_message(self, session_id: str, message: dict):
@@ -117,30 +212,31 @@ class WebSocketManager:
                     "timestamp": self._get_timestamp()
                 })
             
-            logger.debug(f"Handled message type {message_type} for session {session_id}")
+            logger.debug("Handled message type %s for session %s", message_type, session_id)
             
         except Exception as e:
             logger.error(f"Error handling WebSocket message for session {session_id}: {str(e)}")
     
     async def send_violation_alert(self, session_id: str, violation: dict):
         """Send violation alert to student and monitoring dashboard."""
-        alert_message = {
-            "type": "violation_detected",
-            "violation": violation,
-            "timestamp": self._get_timestamp()
-        }
+        # The violation is serialized once and embedded as-is in both messages
+        violation_json = orjson.Fragment(orjson.dumps(violation))
+        timestamp = self._get_timestamp()
         
         # Send to student
-        await self.send_personal_message(session_id, alert_message)
+        await self._send_text(session_id, self._encode({
+            "type": "violation_detected",
+            "violation": violation_json,
+            "timestamp": timestamp
+        }))
         
         # Send to monitoring dashboard
-        admin_message = {
+        await self._broadcast_text("admin", self._encode({
             "type": "violation_alert",
             "session_id": session_id,
-            "violation": violation,
-            "timestamp": self._get_timestamp()
-        }
-        await self.broadcast_to_monitoring("admin", admin_message)
+            "violation": violation_json,
+            "timestamp": timestamp
+        }))
     
     async def send_risk_update(self, session_id: str, risk_score: float):
         """Send risk score update."""
@@ -202,32 +298,56 @@ class WebSocketManager:
     
     def get_monitoring_room_count(self, room: str) -> int:
         """Get number of connections in a monitoring room."""
-        return len(self.monitoring_rooms.get(room, set()))
+        return len(self.monitoring_rooms.get(room, ()))
     
     def _get_timestamp(self) -> str:
-        """Get current timestamp in ISO format."""
-        from datetime import datetime
-        return datetime.utcnow().isoformat()
+        """Get current timestamp in ISO format, reused within the same millisecond of the event loop clock."""
+        now_ms = int(asyncio.get_running_loop().time() * 1000)
+        cached_ms, timestamp = self._timestamp_cache
+        if cached_ms != now_ms:
+            timestamp = datetime.utcnow().isoformat()
+            self._timestamp_cache = (now_ms, timestamp)
+        return timestamp
     
     async def heartbeat_check(self):
-        """Periodic heartbeat check for all connections."""
-        dead_sessions = []
+        """Probe idle connections concurrently and drop those that fail or do not respond in time."""
+        now = asyncio.get_running_loop().time()
+        idle = {
+            session_id: websocket
+            for session_id, websocket in self.active_connections.items()
+            if now - self._last_sent.get(session_id, 0.0) >= self.heartbeat_interval
+        }
         
-        for session_id, websocket in self.active_connections.items():
-            try:
-                await websocket.ping()
-            except Exception as e:
-                logger.warning(f"Heartbeat failed for session {session_id}: {str(e)}")
-                dead_sessions.append(session_id)
+        dead_sessions = []
+        if idle:
+            # ASGI has no ping frame, so the probe is a heartbeat message
+            payload = self._encode({"type": "heartbeat", "timestamp": self._get_timestamp()})
+            probes = {
+                session_id: asyncio.create_task(websocket.send_text(payload))
+                for session_id, websocket in idle.items()
+            }
+            _, pending = await asyncio.wait(probes.values(), timeout=self.heartbeat_timeout)
+            for task in pending:
+                task.cancel()
+            
+            sent_at = asyncio.get_running_loop().time()
+            for session_id, task in probes.items():
+                if task in pending or task.exception() is not None:
+                    reason = "timed out" if task in pending else str(task.exception())
+                    logger.warning(f"Heartbeat failed for session {session_id}: {reason}")
+                    dead_sessions.append(session_id)
+                else:
+                    self._last_sent[session_id] = sent_at
         
-        # Clean up dead connections
+        # Clean up dead connections (unless the session has reconnected in the meantime)
         for session_id in dead_sessions:
-            self.disconnect(session_id)
+            if self.active_connections.get(session_id) is idle[session_id]:
+                self.disconnect(session_id)
         
-        logger.debug(f"Heartbeat check completed. Removed {len(dead_sessions)} dead connections")
+        logger.debug("Heartbeat check completed. Removed %d dead connections", len(dead_sessions))
     
     async def start_heartbeat_task(self):
         """Start background heartbeat task."""
         while True:
-            await asyncio.sleep(30)  # Check every 30 seconds
-            await self.heartbeat_check()
\ No newline at end of file
+            await asyncio.sleep(self.heartbeat_interval)
+            await self.heartbeat_check()
@@ -0,0 +1,63 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from middleware import OriginSetCORSMiddleware
+
+def make_client(allow_origins) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(
+        OriginSetCORSMiddleware,
+        allow_origins=allow_origins,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    return TestClient(app)
+
+ORIGINS = ["http://localhost:3000", "https://*.example.com", "https://moodle-*.school.org"]
+
+@pytest.mark.parametrize("origin, allowed", [
+    ("http://localhost:3000", True),
+    ("https://quiz.example.com", True),
+    ("https://a.b.example.com", True),
+    ("https://moodle-eu.school.org", True),
+    # The wildcard only stands in for part of a host, never the scheme or a path
+    ("http://quiz.example.com", False),
+    ("https://example.com", False),
+    ("https://evil.com/.example.com", False),
+    ("https://quiz.example.com.evil.com", False),
+    ("http://localhost:3001", False),
+])
+def test_origins_are_matched_exactly_or_by_wildcard(origin, allowed):
+    response = make_client(ORIGINS).get("/ping", headers={"Origin": origin})
+
+    assert response.status_code == 200
+    assert (response.headers.get("access-control-allow-origin") == origin) is allowed
+
+def test_preflight_for_a_wildcard_origin_is_accepted():
+    response = make_client(ORIGINS).options("/ping", headers={
+        "Origin": "https://quiz.example.com",
+        "Access-Control-Request-Method": "POST",
+    })
+
+    assert response.status_code == 200
+    assert response.headers["access-control-allow-origin"] == "https://quiz.example.com"
+
+def test_preflight_for_an_unknown_origin_is_rejected():
+    response = make_client(ORIGINS).options("/ping", headers={
+        "Origin": "https://evil.com",
+        "Access-Control-Request-Method": "POST",
+    })
+
+    assert response.status_code == 400
+
+def test_lone_star_allows_every_origin():
+    response = make_client(["*"]).get("/ping", headers={"Origin": "https://anything.test"})
+
+    assert response.headers.get("access-control-allow-origin") in ("*", "https://anything.test")
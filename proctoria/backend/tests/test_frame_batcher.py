@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from services.frame_batcher import FrameBatcher
+
+class FakeMLService:
+    """Stands in for the Lazy ML service: records batch sizes and echoes each frame back."""
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.batches = []
+
+    async def get(self):
+        return self
+
+    async def process_video_frame_batch(self, frames, session_ids):
+        self.batches.append(list(frames))
+        if self.fail:
+            raise RuntimeError("model failure")
+        return [[frame] for frame in frames]
+
+def test_frames_are_batched_up_to_max_size():
+    async def run():
+        ml_service = FakeMLService()
+        batcher = FrameBatcher(ml_service, max_batch_size=4, max_wait_ms=5)
+        await batcher.start()
+        try:
+            results = await asyncio.gather(*(batcher.submit(i, "session") for i in range(10)))
+        finally:
+            await batcher.stop()
+        return ml_service, results
+
+    ml_service, results = asyncio.run(run())
+    assert results == [[i] for i in range(10)]
+    assert [len(batch) for batch in ml_service.batches] == [4, 4, 2]
+
+def test_partial_batch_is_flushed_when_the_wait_window_closes():
+    async def run():
+        ml_service = FakeMLService()
+        batcher = FrameBatcher(ml_service, max_batch_size=16, max_wait_ms=5)
+        await batcher.start()
+        try:
+            result = await asyncio.wait_for(batcher.submit("frame", "session"), 1)
+        finally:
+            await batcher.stop()
+        return ml_service, result
+
+    ml_service, result = asyncio.run(run())
+    assert result == ["frame"]
+    assert ml_service.batches == [["frame"]]
+
+def test_frames_arriving_during_the_window_join_the_batch():
+    async def run():
+        ml_service = FakeMLService()
+        batcher = FrameBatcher(ml_service, max_batch_size=16, max_wait_ms=50)
+        await batcher.start()
+        try:
+            first = asyncio.ensure_future(batcher.submit(1, "a"))
+            await asyncio.sleep(0.01)
+            second = asyncio.ensure_future(batcher.submit(2, "b"))
+            await asyncio.wait_for(asyncio.gather(first, second), 1)
+        finally:
+            await batcher.stop()
+        return ml_service
+
+    assert asyncio.run(run()).batches == [[1, 2]]
+
+def test_failed_batch_fails_every_frame_in_it():
+    async def run():
+        batcher = FrameBatcher(FakeMLService(fail=True), max_batch_size=4, max_wait_ms=5)
+        await batcher.start()
+        try:
+            return await asyncio.gather(*(batcher.submit(i, "session") for i in range(3)), return_exceptions=True)
+        finally:
+            await batcher.stop()
+
+    results = asyncio.run(run())
+    assert len(results) == 3
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+def test_stop_cancels_frames_that_were_never_batched():
+    async def run():
+        batcher = FrameBatcher(FakeMLService(), max_batch_size=4, max_wait_ms=5)
+        await batcher.start()
+        # Stop the worker first so the submitted frame stays pending
+        batcher._worker.cancel()
+        pending = asyncio.ensure_future(batcher.submit("frame", "session"))
+        await asyncio.sleep(0)
+        await batcher.stop()
+        with pytest.raises(asyncio.CancelledError):
+            await pending
+
+    asyncio.run(run())
+
+def test_submit_without_worker_processes_directly():
+    async def run():
+        ml_service = FakeMLService()
+        ml_service.process_video_frame = lambda frame, session_id: asyncio.sleep(0, [frame])
+        return await FrameBatcher(ml_service).submit("frame", "session")
+
+    assert asyncio.run(run()) == ["frame"]
@@ -0,0 +1,96 @@
+import asyncio
+import io
+
+import pytest
+from starlette.datastructures import UploadFile
+
+from services.upload_buffers import UploadBufferPool, UploadTooLargeError
+
+KB = 1024
+
+def make_upload(data: bytes, size=None) -> UploadFile:
+    return UploadFile(file=io.BytesIO(data), size=len(data) if size is None else size)
+
+async def read_all(pool: UploadBufferPool, upload: UploadFile):
+    async with pool.read(upload) as view:
+        return bytes(view), len(view.obj)
+
+def test_buffers_are_sized_by_power_of_two_classes():
+    pool = UploadBufferPool(1024 * KB, min_buffer_size=64 * KB)
+    assert pool._size_class(10) == 64 * KB
+    assert pool._size_class(64 * KB) == 64 * KB
+    assert pool._size_class(64 * KB + 1) == 128 * KB
+    assert pool._size_class(700 * KB) == 1024 * KB
+    # Unknown sizes take the largest class
+    assert pool._size_class(None) == 1024 * KB
+
+def test_read_returns_the_upload_bytes_in_a_class_sized_buffer():
+    pool = UploadBufferPool(1024 * KB)
+    data = b"abc" * 40_000
+
+    contents, buffer_size = asyncio.run(read_all(pool, make_upload(data)))
+
+    assert contents == data
+    assert buffer_size == 128 * KB
+
+def test_released_buffers_are_reused():
+    pool = UploadBufferPool(1024 * KB)
+
+    async def run():
+        async with pool.read(make_upload(b"first")) as view:
+            first = view.obj
+        async with pool.read(make_upload(b"second")) as view:
+            return first, view.obj, bytes(view)
+
+    first, second, contents = asyncio.run(run())
+    assert first is second
+    assert contents == b"second"
+
+def test_pool_is_capped_by_total_bytes():
+    pool = UploadBufferPool(1024 * KB, max_pooled_bytes=200 * KB)
+
+    async def run():
+        # Hold three buffers at once, then release them all
+        async with pool.read(make_upload(b"a" * 10)):
+            async with pool.read(make_upload(b"b" * 100 * KB)):
+                async with pool.read(make_upload(b"c" * 100 * KB)):
+                    pass
+
+    asyncio.run(run())
+    assert pool._pooled_bytes <= 200 * KB
+    assert {size: len(buffers) for size, buffers in pool._free.items()} == {128 * KB: 1, 64 * KB: 1}
+
+def test_upload_reported_too_large_is_rejected_before_allocating():
+    pool = UploadBufferPool(64 * KB)
+    with pytest.raises(UploadTooLargeError):
+        asyncio.run(read_all(pool, make_upload(b"x" * (64 * KB + 1))))
+    assert pool._pooled_bytes == 0
+
+def test_upload_larger_than_reported_is_rejected():
+    pool = UploadBufferPool(1024 * KB)
+    with pytest.raises(UploadTooLargeError):
+        asyncio.run(read_all(pool, make_upload(b"x" * (64 * KB + 10), size=10)))
+    # The buffer goes back to the pool after the failed read
+    assert pool._pooled_bytes == 64 * KB
+
+def test_buffer_is_returned_when_the_block_raises():
+    pool = UploadBufferPool(1024 * KB)
+
+    async def run():
+        async with pool.read(make_upload(b"frame")):
+            raise ValueError("bad frame")
+
+    with pytest.raises(ValueError):
+        asyncio.run(run())
+    assert pool._pooled_bytes == 64 * KB
+
+def test_buffer_is_not_reused_after_cancellation():
+    pool = UploadBufferPool(1024 * KB)
+
+    async def run():
+        async with pool.read(make_upload(b"frame")):
+            raise asyncio.CancelledError()
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(run())
+    assert pool._pooled_bytes == 0
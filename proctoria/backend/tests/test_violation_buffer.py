@@ -0,0 +1,140 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+import services.violation_buffer as violation_buffer_module
+from schemas.schemas import ViolationCreate
+from services.violation_buffer import ViolationWriteBuffer
+
+VIOLATION = ViolationCreate(type="tab_switch", confidence=0.9)
+
+@asynccontextmanager
+async def fake_session():
+    yield None
+
+@pytest.fixture(autouse=True)
+def no_database(monkeypatch):
+    monkeypatch.setattr(violation_buffer_module, "SessionLocal", fake_session)
+
+class FakeProcessor:
+    """Records each write and fails those containing a bad session (or the first few writes)."""
+
+    def __init__(self, bad_sessions=(), fail_first: int = 0):
+        self.bad_sessions = set(bad_sessions)
+        self.fail_first = fail_first
+        self.writes = []
+
+    async def copy_violations(self, db, violations_by_session):
+        self.writes.append(sorted(violations_by_session))
+        if self.fail_first or self.bad_sessions & violations_by_session.keys():
+            self.fail_first = max(self.fail_first - 1, 0)
+            raise RuntimeError("deadlock detected")
+        return {session_id: len(violations) for session_id, violations in violations_by_session.items()}
+
+class FakeStatusCache:
+    def __init__(self):
+        self.recorded = {}
+
+    async def violations_recorded(self, session_id, count):
+        self.recorded[session_id] = self.recorded.get(session_id, 0) + count
+
+class FakeRiskCalculator:
+    def __init__(self):
+        self.scheduled = []
+
+    def schedule_session_risk_update(self, session_id):
+        self.scheduled.append(session_id)
+
+def make_buffer(processor, max_pending: int = 128, max_attempts: int = 3):
+    buffer = ViolationWriteBuffer(
+        processor, FakeStatusCache(), FakeRiskCalculator(), max_pending=max_pending, max_attempts=max_attempts
+    )
+    # Pretend the timer task is running so add() only buffers
+    buffer._worker = object()
+    return buffer
+
+def test_flush_writes_all_sessions_in_one_batch():
+    processor = FakeProcessor()
+    buffer = make_buffer(processor)
+
+    async def run():
+        await buffer.add("a", [VIOLATION, VIOLATION])
+        await buffer.add("b", [VIOLATION])
+        await buffer.flush()
+
+    asyncio.run(run())
+    assert processor.writes == [["a", "b"]]
+    assert buffer.status_cache.recorded == {"a": 2, "b": 1}
+    assert sorted(buffer.risk_calculator.scheduled) == ["a", "b"]
+
+def test_reaching_max_pending_flushes_early():
+    processor = FakeProcessor()
+    buffer = make_buffer(processor, max_pending=3)
+
+    async def run():
+        await buffer.add("a", [VIOLATION, VIOLATION])
+        assert processor.writes == []
+        await buffer.add("b", [VIOLATION])
+
+    asyncio.run(run())
+    assert processor.writes == [["a", "b"]]
+
+def test_failed_flush_is_requeued_and_retried():
+    processor = FakeProcessor(fail_first=1)
+    buffer = make_buffer(processor)
+
+    async def run():
+        await buffer.add("a", [VIOLATION])
+        await buffer.add("b", [VIOLATION])
+        await buffer.flush()
+        assert buffer._pending_count == 2
+        await buffer.flush()
+
+    asyncio.run(run())
+    # Retried sessions are written one per transaction
+    assert processor.writes == [["a", "b"], ["a"], ["b"]]
+    assert buffer.status_cache.recorded == {"a": 1, "b": 1}
+    assert buffer._pending == {} and buffer._failed_attempts == {}
+
+def test_bad_session_is_dropped_after_max_attempts_without_holding_back_others():
+    processor = FakeProcessor(bad_sessions={"bad"})
+    buffer = make_buffer(processor, max_attempts=3)
+
+    async def run():
+        for session_id in ("a", "bad"):
+            await buffer.add(session_id, [VIOLATION])
+        for _ in range(3):
+            await buffer.flush()
+
+    asyncio.run(run())
+    assert processor.writes == [["a", "bad"], ["a"], ["bad"], ["bad"]]
+    assert buffer.status_cache.recorded == {"a": 1}
+    assert buffer._pending == {} and buffer._failed_attempts == {}
+
+def test_requeued_violations_stay_ahead_of_newer_ones():
+    processor = FakeProcessor(fail_first=1)
+    buffer = make_buffer(processor)
+    older = ViolationCreate(type="copy_paste", confidence=0.5)
+
+    async def run():
+        await buffer.add("a", [older])
+        await buffer.flush()
+        await buffer.add("a", [VIOLATION])
+
+    asyncio.run(run())
+    assert buffer._pending["a"] == [older, VIOLATION]
+
+def test_stop_gives_requeued_violations_their_remaining_attempts():
+    processor = FakeProcessor(fail_first=1)
+    buffer = ViolationWriteBuffer(processor, FakeStatusCache(), max_attempts=3)
+
+    async def run():
+        await buffer.start()
+        buffer._pending["a"] = [VIOLATION]
+        buffer._pending_count = 1
+        await buffer.stop()
+
+    asyncio.run(run())
+    assert processor.writes == [["a"], ["a"]]
+    assert buffer.status_cache.recorded == {"a": 1}